@@ -0,0 +1,157 @@
+import argparse
+import concurrent.futures
+import functools
+import glob
+import json
+import os
+import sys
+import time
+import numpy as np
+
+import LapTimeEvaluator as LTE
+import RacingLineSolver as RLS
+import Spline as SP
+import TrackCache as TC
+import Tracks
+
+# Computes racing lines for a whole directory of track files without opening a window. Tracks are
+# spread over a pool of processes, and each result is written as soon as its track is finished.
+#
+#   python BatchRacingLine.py tracks/ --output results/ --mode curvature
+#
+# Every track file gets <file name>.json in the output directory with its racing line, such as
+# oval.csv.json, and one line per track is appended to summary.jsonl with its timing and convergence
+# stats. With --cache-dir, solved racing lines are kept on disk, and tracks solved before with the
+# same settings are loaded instead.
+
+@functools.lru_cache(maxsize=None)
+def OpenCache(sDirectory, nMaxBytes):
+    return TC.TrackCache(sDirectory, nMaxBytes)
+    # One cache object per worker process, so the size it keeps track of carries over from track to track
+
+def SolveTrackFile(sFileName, options):
+    # Compute the racing line of one track file, run in a worker process
+    fStart = time.perf_counter()
+    vecPoints, fTrackWidth = Tracks.LoadTrack(sFileName)
+    if fTrackWidth is None:
+        fTrackWidth = options['track_width']
+    if len(vecPoints) < 4:
+        raise ValueError('a looped track needs at least 4 control points, got %d' % len(vecPoints))
+
+    cache = OpenCache(options['cache_dir'], options['cache_bytes']) if options['cache_dir'] else None
+    path = SP.Spline()
+    path.SetPoints(vecPoints)
+    if cache is None or not cache.LoadSpline(path):
+        path.UpdateSplineProperties()
+        if cache is not None:
+            cache.SaveSpline(path)
+
+    solver = RLS.RacingLineSolver(fTrackWidth=fTrackWidth, fTolerance=options['tolerance'])
+    solver.bMinimumCurvature = options['mode'] == 'curvature'
+    solver.fCurvatureBlend = options['blend']
+    solver.SetTrackFromSpline(path)
+    fLoaded = time.perf_counter()
+
+    cached = None
+    if cache is not None:
+        sKey = cache.GetKey('racing_line', vecPoints, track_width=fTrackWidth, mode=options['mode'],
+                            blend=options['blend'], iterations=options['iterations'], tolerance=options['tolerance'])
+        cached = cache.Load(sKey, ['displacement', 'solve'])
+
+    if cached is not None:
+        # Solved before with the same settings, so take the result, the stats it was solved with and its lap time
+        solver.vecDisplacement = np.array(cached['displacement'])
+        solver.UpdateRacingLine()
+        nIterations, fResidual, fConverged, fLapTime = cached['solve'].tolist()
+        solver.nIterationsRun, solver.fResidual, solver.bConverged = int(nIterations), fResidual, bool(fConverged)
+    else:
+        solver.Solve(options['iterations'])
+        fLapTime = float(LTE.LapTimeEvaluator().EvaluateLines(solver.vecRacingLine[None]).fLapTime[0])
+        if cache is not None:
+            vecSolve = np.array([solver.nIterationsRun, solver.fResidual, solver.bConverged, fLapTime])
+            cache.Save(sKey, dict(displacement=solver.vecDisplacement, solve=vecSolve))
+    fSolved = time.perf_counter()
+
+    racingLine = SP.Spline()
+    racingLine.SetPoints(solver.vecRacingLine, bCopy=False)
+    if cache is None or not cache.LoadSpline(racingLine):
+        racingLine.UpdateSplineProperties()
+        if cache is not None:
+            cache.SaveSpline(racingLine)
+
+    return dict(
+        track=os.path.splitext(os.path.basename(sFileName))[0], file=sFileName, nodes=len(vecPoints),
+        track_width=fTrackWidth, mode=options['mode'], iterations=solver.nIterationsRun,
+        residual=solver.fResidual, converged=solver.bConverged, cached=cached is not None,
+        centre_length=path.fTotalSplineLength, racing_line_length=racingLine.fTotalSplineLength,
+        lap_time=fLapTime,
+        load_seconds=fLoaded - fStart, solve_seconds=fSolved - fLoaded, seconds=time.perf_counter() - fStart,
+        displacement=solver.vecDisplacement, racing_line=solver.vecRacingLine)
+        # Arrays rather than lists, they pickle back to the main process as one block each
+
+def FindTrackFiles(sDirectory):
+    listFiles = []
+    for sPattern in ('*.json', '*.csv'):
+        listFiles += glob.glob(os.path.join(sDirectory, sPattern))
+    return sorted(listFiles)
+
+def Main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute racing lines for a directory of track files.')
+    parser.add_argument('input', help='directory of .json or .csv track files')
+    parser.add_argument('--output', default='racing_lines', help='directory the results are written to')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, all cores by default')
+    parser.add_argument('--mode', choices=('relax', 'curvature'), default='relax',
+                        help='iterative shortest path relaxation, or the direct minimum curvature solve')
+    parser.add_argument('--blend', type=float, default=1.0,
+                        help='curvature against path length weight of the minimum curvature solve')
+    parser.add_argument('--iterations', type=int, default=1000, help='most relaxation iterations per track')
+    parser.add_argument('--tolerance', type=float, default=1e-4, help='displacement change counted as converged')
+    parser.add_argument('--track-width', type=float, default=10.0, help='track width for files that give none')
+    parser.add_argument('--cache-dir', default=None, help='directory to cache solved racing lines in, none by default')
+    parser.add_argument('--cache-size', type=float, default=256.0, help='megabytes the cache is trimmed back to')
+    args = parser.parse_args(argv)
+    if os.path.realpath(args.output) == os.path.realpath(args.input):
+        parser.error('the output directory must not be the input directory, the results would overwrite the tracks')
+
+    listFiles = FindTrackFiles(args.input)
+    os.makedirs(args.output, exist_ok=True)
+    options = dict(mode=args.mode, blend=args.blend, iterations=args.iterations,
+                   tolerance=args.tolerance, track_width=args.track_width,
+                   cache_dir=args.cache_dir, cache_bytes=int(args.cache_size * 1024 * 1024))
+
+    nFailed = 0
+    fStart = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor, \
+            open(os.path.join(args.output, 'summary.jsonl'), 'a') as summary:
+        futures = {executor.submit(SolveTrackFile, sFileName, options): sFileName for sFileName in listFiles}
+
+        for nDone, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            sFileName = futures.pop(future)
+            # Forget every future once it is done, so finished results are not all held until the end of the batch
+            try:
+                result = future.result()
+            except Exception as e:
+                # A broken track file should not stop the rest of the batch
+                nFailed += 1
+                summary.write(json.dumps(dict(file=sFileName, error=repr(e))) + '\n')
+                summary.flush()
+                print('[%d/%d] %s failed: %r' % (nDone, len(listFiles), sFileName, e), file=sys.stderr)
+                continue
+
+            with open(os.path.join(args.output, os.path.basename(sFileName) + '.json'), 'w') as f:
+                # Named after the whole file name, so oval.json and oval.csv do not overwrite each other
+                json.dump(dict(result, displacement=result['displacement'].tolist(),
+                               racing_line=result['racing_line'].tolist()), f)
+
+            stats = {k: v for k, v in result.items() if k not in ('displacement', 'racing_line')}
+            summary.write(json.dumps(stats) + '\n')
+            summary.flush()
+            print('[%d/%d] %s: %d nodes, %d iterations, residual %.2e, %.3f s' %
+                  (nDone, len(listFiles), result['track'], result['nodes'], result['iterations'],
+                   result['residual'], result['seconds']), file=sys.stderr)
+
+    print('%d tracks, %d failed, %.2f s' % (len(listFiles), nFailed, time.perf_counter() - fStart), file=sys.stderr)
+    return 1 if nFailed else 0
+
+if __name__ == '__main__':
+    sys.exit(Main())
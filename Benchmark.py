@@ -0,0 +1,150 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+
+import CarFleet as CF
+import LapTimeEvaluator as LTE
+import RacingLineSolver as RLS
+import SpatialIndex as SI
+import Spline as SP
+import Tracks
+
+# Headless benchmarks for Spline and the racing line solver. Nothing here imports pygame, so it runs
+# without a display. Results are written as JSON so runs before and after a change can be compared.
+#
+#   python Benchmark.py --nodes 100 1000 10000 100000 --output results.json
+
+def TimeCall(fn, nCalls=1, fMinTime=0.2, nMaxRepeats=1000):
+    # Call fn() repeatedly until at least fMinTime has passed, and return the best time for one run.
+    # nCalls is how many operations one run of fn() performs, so the result is the time per operation
+    fBest = float('inf')
+    fStart = time.perf_counter()
+    for n in range(nMaxRepeats):
+        t0 = time.perf_counter()
+        fn()
+        fBest = min(fBest, time.perf_counter() - t0)
+        if time.perf_counter() - fStart >= fMinTime:
+            break
+    return fBest / nCalls
+
+def MakeSpline(vecPoints):
+    spline = SP.Spline()
+    spline.SetPoints(vecPoints)
+    spline.UpdateSplineProperties()
+    return spline
+
+def BenchmarkTrack(sTrack, vecPoints, args):
+    # Time every operation on one track, returning a list of result records
+    listResults = []
+    nNodes = len(vecPoints)
+    spline = MakeSpline(vecPoints)
+    rng = np.random.default_rng(0)
+
+    def Record(sName, fSeconds, **extra):
+        listResults.append(dict(benchmark=sName, track=sTrack, nodes=nNodes, seconds=fSeconds, **extra))
+        print('%-32s %-12s %8d nodes %12.3f us' % (sName, sTrack, nNodes, fSeconds * 1e6), file=sys.stderr)
+
+    # Spline evaluation, one scalar call at a time and as a batch
+    t = rng.random(args.samples) * nNodes
+    Record('GetSplinePoint', TimeCall(lambda: [spline.GetSplinePoint(x) for x in t.tolist()], len(t), args.min_time))
+    Record('GetSplineGradient', TimeCall(lambda: [spline.GetSplineGradient(x) for x in t.tolist()], len(t), args.min_time))
+    Record('GetSplinePoints', TimeCall(lambda: spline.GetSplinePoints(t), len(t), args.min_time))
+    Record('GetSplineGradients', TimeCall(lambda: spline.GetSplineGradients(t), len(t), args.min_time))
+
+    # Arc length of single segments, and of the whole spline
+    nodes = rng.integers(0, nNodes, min(nNodes, args.segments)).tolist()
+    Record('CalculateSegmentLength', TimeCall(lambda: [spline.CalculateSegmentLength(i) for i in nodes], len(nodes), args.min_time))
+
+    def UpdateAll():
+        spline.SetPoints(vecPoints)
+        spline.UpdateSplineProperties()
+    Record('UpdateSplineProperties', TimeCall(UpdateAll, 1, args.min_time))
+
+    def UpdateOne():
+        i = int(rng.integers(nNodes))
+        spline.SetControlPoint(i, *spline.vecPoints[i])
+        spline.UpdateSplineProperties()
+    Record('UpdateSplineProperties.dirty', TimeCall(UpdateOne, 1, args.min_time))
+
+    # Distance to parameter mapping
+    p = rng.random(args.samples) * spline.fTotalSplineLength
+    spline.GetArcLengthTable()
+    # Build the table the lookups share up front, the dirty updates above threw it away
+    Record('GetNormalisedOffset', TimeCall(lambda: [spline.GetNormalisedOffset(x) for x in p[:args.segments].tolist()],
+                                           min(len(p), args.segments), args.min_time))
+    Record('GetNormalisedOffsets', TimeCall(lambda: spline.GetNormalisedOffsets(p), len(p), args.min_time))
+
+    # A fleet of cars driving the spline, seconds per car for one step and for posing every model
+    fleet = CF.CarFleet()
+    fleet.Reset(args.samples, spline.fTotalSplineLength)
+    Record('CarFleet.Step', TimeCall(lambda: fleet.Step(1.0 / 60.0, spline), args.samples, args.min_time))
+    Record('CarFleet.GetModels', TimeCall(lambda: fleet.GetModels([[2, 0], [0, -1], [0, 1]], 3.0), args.samples, args.min_time))
+
+    # Nearest control point and closest point on the spline, per query position around the track
+    vecQuery = spline.GetSplinePoints(t) + rng.normal(0.0, args.track_width, (len(t), 2))
+    nodeIndex = SI.PointGrid()
+    nodeIndex.Build(spline.vecPoints)
+    Record('PointGrid.Nearest', TimeCall(lambda: nodeIndex.Nearest(vecQuery), len(vecQuery), args.min_time))
+    splineIndex = SI.SplineIndex(spline)
+    Record('SplineIndex.Build', TimeCall(splineIndex.Build, 1, args.min_time))
+    Record('SplineIndex.Project', TimeCall(lambda: splineIndex.Project(vecQuery), len(vecQuery), args.min_time))
+
+    # Racing line, seconds per relaxation iteration and for one whole minimum curvature solve
+    solver = RLS.RacingLineSolver(fTrackWidth=args.track_width, fTolerance=0.0)
+    solver.SetTrackFromSpline(spline)
+    Record('RacingLineSolver.Step', TimeCall(lambda: solver.Solve(args.iterations), args.iterations, args.min_time))
+
+    def SolveMinimumCurvature():
+        solver.bMinimumCurvature = True
+        solver.fTolerance = 1e-4
+        solver.ResetNodes()
+        solver.Solve(1)
+    fSeconds = TimeCall(SolveMinimumCurvature, 1, args.min_time, nMaxRepeats=args.repeats)
+    Record('RacingLineSolver.MinimumCurvature', fSeconds,
+           iterations=solver.nIterationsRun, residual=solver.fResidual)
+
+    # Lap times of candidate racing lines, seconds per candidate. The candidates are the solved line
+    # jittered across the track, as many as keep the total number of control points near args.samples
+    lapTimes = LTE.LapTimeEvaluator()
+    nCandidates = max(1, args.samples // len(spline.vecPoints))
+    displacements = solver.vecDisplacement + rng.normal(0.0, 0.2 * args.track_width, (nCandidates, nNodes))
+    displacements = np.clip(displacements, -args.track_width, args.track_width)
+    Record('LapTimeEvaluator.EvaluateDisplacements',
+           TimeCall(lambda: lapTimes.EvaluateDisplacements(solver.vecCentre, solver.vecNormal, displacements),
+                    nCandidates, args.min_time, nMaxRepeats=args.repeats),
+           candidates=nCandidates, lap_time=float(lapTimes.EvaluateSpline(MakeSpline(solver.vecRacingLine)).fLapTime[0]))
+
+    return listResults
+
+def Main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless benchmarks for Spline and the racing line solver.')
+    parser.add_argument('--nodes', type=int, nargs='*', default=[100, 1000, 10000, 100000],
+                        help='sizes of the generated tracks, the handcrafted track is always included')
+    parser.add_argument('--output', default='benchmark.json', help='JSON file to write the results to')
+    parser.add_argument('--samples', type=int, default=10000, help='parameters evaluated per batch')
+    parser.add_argument('--segments', type=int, default=1000, help='calls made per scalar benchmark')
+    parser.add_argument('--iterations', type=int, default=20, help='relaxation iterations per timing')
+    parser.add_argument('--repeats', type=int, default=5, help='most repeats of the minimum curvature solve')
+    parser.add_argument('--track-width', type=float, default=10.0, help='track width for the racing line')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds to spend repeating each timing')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the generated tracks')
+    args = parser.parse_args(argv)
+
+    listResults = BenchmarkTrack('handcrafted', np.array(Tracks.HANDCRAFTED_TRACK), args)
+    for nNodes in args.nodes:
+        listResults += BenchmarkTrack('generated', Tracks.GenerateTrack(nNodes, args.seed), args)
+
+    report = dict(
+        meta=dict(time=time.strftime('%Y-%m-%dT%H:%M:%S'), python=platform.python_version(),
+                  numpy=np.__version__, machine=platform.machine(), platform=platform.platform(),
+                  args=vars(args)),
+        results=listResults)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+
+if __name__ == '__main__':
+    Main()
@@ -0,0 +1,62 @@
+import numpy as np
+
+# Many cars driving around a racing line at once. Their distances along the line and speeds are
+# arrays, so the whole fleet is moved and posed in a handful of NumPy calls.
+
+def TransformModels(model, vecPosition, vecDirection, fScale=1.0):
+    # Place one copy of a wireframe model at every position, rotated to face along the matching unit
+    # direction vector, as an (N,V,2) array of vertices. The rotations are built from the directions
+    # directly, so no angles or trigonometry are involved
+    model = np.asarray(model, dtype=np.float64).reshape(-1, 2) * fScale
+    vecPosition = np.asarray(vecPosition, dtype=np.float64).reshape(-1, 2)
+    vecDirection = np.asarray(vecDirection, dtype=np.float64).reshape(-1, 2)
+
+    c, s = vecDirection[:, 0], vecDirection[:, 1]
+    rotation = np.stack((np.stack((c, -s), axis=-1), np.stack((s, c), axis=-1)), axis=1)
+    # (N,2,2) rotation matrices, [[cos, -sin], [sin, cos]] for every car
+
+    return vecPosition[:, None, :] + np.einsum('nij,vj->nvi', rotation, model)
+
+class CarFleet:
+    def __init__(self, nSeed=0):
+        self.vecDistance = np.zeros(0)
+        # Distance of every car along the racing line
+        self.vecSpeed = np.zeros(0)
+        # Speed of every car, in distance per second
+        self.vecPosition = np.zeros((0, 2))
+        # Position of every car after the last 'Step'
+        self.vecDirection = np.zeros((0, 2))
+        # Unit vector every car faces along after the last 'Step'
+        self.rng = np.random.default_rng(nSeed)
+
+    def GetCarCount(self):
+        return len(self.vecDistance)
+
+    def Reset(self, nCars, fLength, fSpeed=2.0, fSpeedSpread=0.5):
+        # Spread nCars cars evenly around a line of length fLength, with speeds up to fSpeedSpread
+        # either side of fSpeed
+        self.vecDistance = np.linspace(0.0, fLength, nCars, endpoint=False)
+        self.vecSpeed = fSpeed + (self.rng.random(nCars) * 2.0 - 1.0) * fSpeedSpread
+        self.vecPosition = np.zeros((nCars, 2))
+        self.vecDirection = np.tile((1.0, 0.0), (nCars, 1))
+
+    def Step(self, fElapsedTime, spline):
+        # Move every car along the spline, which has to have its lengths up to date. Distances wrap
+        # around the length of the spline, which may have changed since the last step
+        fLength = spline.fTotalSplineLength
+        if fLength <= 0.0 or self.GetCarCount() == 0:
+            return
+
+        self.vecDistance = np.mod(self.vecDistance + self.vecSpeed * fElapsedTime, fLength)
+        t = spline.GetNormalisedOffsets(self.vecDistance, nNewtonSteps=1)
+        # Distances are arc lengths, so cars keep their speed however the control points are spaced. One
+        # Newton step puts every car well within a pixel
+
+        self.vecPosition = spline.GetSplinePoints(t)
+        g = spline.GetSplineGradients(t)
+        fSpeed = np.hypot(g[:, 0], g[:, 1])
+        self.vecDirection = np.divide(g, fSpeed[:, None], out=np.tile((1.0, 0.0), (len(g), 1)), where=fSpeed[:, None] > 0.0)
+
+    def GetModels(self, model, fScale=1.0):
+        # Vertices of every car's model as an (N,V,2) array, posed by the last 'Step'
+        return TransformModels(model, self.vecPosition, self.vecDirection, fScale)
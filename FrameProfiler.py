@@ -0,0 +1,67 @@
+import collections
+import contextlib
+import json
+import time
+import numpy as np
+
+# Times each phase of a frame, keeps rolling percentiles for an on-screen overlay, and records the
+# most recent frames as a Chrome trace (load the exported file in chrome://tracing or Perfetto).
+
+class FrameProfiler:
+    def __init__(self, nWindow=240, nMaxTraceEvents=100000):
+        self.nWindow = nWindow
+        # Number of recent frames the percentiles are taken over
+        self.dictSamples = collections.OrderedDict()
+        # Recent durations in seconds of every phase, in the order the phases first ran
+        self.listTrace = collections.deque(maxlen=nMaxTraceEvents)
+        # Recent (name, start, duration, depth) events, for the trace export
+        self.fOrigin = time.perf_counter()
+        # Trace timestamps are relative to when the profiler was created
+        self.nDepth = 0
+        # How many phases are currently open, nested phases are drawn below their parent in the trace
+        self.bEnabled = True
+
+    @contextlib.contextmanager
+    def Phase(self, sName):
+        # Time the code inside a 'with' block as one phase of the frame
+        if not self.bEnabled:
+            yield
+            return
+
+        self.nDepth += 1
+        fStart = time.perf_counter()
+        try:
+            yield
+        finally:
+            fDuration = time.perf_counter() - fStart
+            self.nDepth -= 1
+            self.AddSample(sName, fStart, fDuration)
+
+    def AddSample(self, sName, fStart, fDuration):
+        samples = self.dictSamples.get(sName)
+        if samples is None:
+            samples = self.dictSamples[sName] = collections.deque(maxlen=self.nWindow)
+        samples.append(fDuration)
+        self.listTrace.append((sName, fStart, fDuration, self.nDepth))
+
+    def GetStats(self):
+        # Rolling p50 and p99 of every phase in seconds, keyed by phase name
+        return collections.OrderedDict(
+            (sName, tuple(np.percentile(np.fromiter(samples, dtype=np.float64), (50, 99))))
+            for sName, samples in self.dictSamples.items() if samples)
+
+    def GetOverlayLines(self):
+        # Text lines for the on-screen overlay, times in milliseconds
+        listLines = ['%-18s %7s %7s' % ('phase', 'p50 ms', 'p99 ms')]
+        for sName, (fP50, fP99) in self.GetStats().items():
+            listLines.append('%-18s %7.2f %7.2f' % (sName, fP50 * 1000.0, fP99 * 1000.0))
+        return listLines
+
+    def ExportChromeTrace(self, sFileName):
+        # Write the recorded events in the Chrome trace event format, as complete ('X') events in microseconds
+        listEvents = [dict(name=sName, cat='frame', ph='X', pid=0, tid=0,
+                           ts=(fStart - self.fOrigin) * 1e6, dur=fDuration * 1e6, args=dict(depth=nDepth))
+                      for sName, fStart, fDuration, nDepth in self.listTrace]
+
+        with open(sFileName, 'w') as f:
+            json.dump(dict(traceEvents=listEvents, displayTimeUnit='ms'), f)
@@ -0,0 +1,145 @@
+import collections
+import numpy as np
+import Spline as SP
+
+# Speed profiles and lap times of looped racing lines. Every line is sampled at fixed arc-length
+# steps, the curvature there gives a cornering speed limit, and forward (accelerating) and backward
+# (braking) passes turn the limits into the speed a car can actually carry. Whole batches of
+# candidate lines are evaluated at once as (K,N,2) arrays of Catmull-Rom control points, so
+# thousands of candidate displacements can be compared.
+
+NEWTON_NODES, NEWTON_WEIGHTS = np.polynomial.legendre.leggauss(3)
+# A cheaper 3-point rule for the short distances integrated by every sample's Newton step
+
+LapProfile = collections.namedtuple('LapProfile', ('fLapTime', 'vecDistance', 'vecSpeed', 'vecSpeedLimit', 'vecCurvature'))
+# Lap time of every line, and the distance, speed, cornering speed limit and curvature at every sample
+# of every line, as (K,) and (K,M) arrays
+
+class LapTimeEvaluator:
+    def __init__(self, fMaxSpeed=50.0, fMaxLateralAcceleration=30.0, fMaxAcceleration=10.0, fMaxBraking=20.0, fStep=1.0):
+        self.fMaxSpeed = fMaxSpeed
+        # Top speed on a straight, in track units per second
+        self.fMaxLateralAcceleration = fMaxLateralAcceleration
+        # Cornering grip, the speed limit through a curve of curvature k is sqrt(fMaxLateralAcceleration / |k|)
+        self.fMaxAcceleration = fMaxAcceleration
+        # Largest gain in speed per second
+        self.fMaxBraking = fMaxBraking
+        # Largest loss in speed per second
+        self.fStep = fStep
+        # Longest arc-length step between samples of a line
+        self.nSubSteps = 4
+        # Gauss-Legendre steps per segment when measuring the length of a line
+        self.nBatchSize = 32
+        # Most candidate lines evaluated in one set of arrays by 'EvaluateDisplacements'
+
+    def EvaluateSpline(self, spline):
+        # Profile of a looped spline, such as the racing line. Its fields have a leading axis of length one
+        return self.EvaluateLines(spline.vecPoints[None])
+
+    def EvaluateDisplacements(self, vecCentre, vecNormal, displacements):
+        # Lap time of every candidate line, given as a (K,N) array of displacements along the centre line
+        # normals, the same representation 'RacingLineSolver' optimizes
+        displacements = np.atleast_2d(np.asarray(displacements, dtype=np.float64))
+        fLapTime = np.empty(len(displacements))
+        for k in range(0, len(displacements), self.nBatchSize):
+            vecLines = vecCentre[None] + vecNormal[None] * displacements[k:k + self.nBatchSize, :, None]
+            fLapTime[k:k + self.nBatchSize] = self.EvaluateLines(vecLines).fLapTime
+            # Evaluate in batches, so the arrays stay a sensible size for long tracks
+        return fLapTime
+
+    def EvaluateLines(self, vecLines):
+        # Profile of every looped line of a (K,N,2) array of control points
+        vecLines = np.asarray(vecLines, dtype=np.float64)
+        nLines, nSegments = vecLines.shape[:2]
+        control = np.stack((np.roll(vecLines, 1, axis=1), vecLines,
+                            np.roll(vecLines, -1, axis=1), np.roll(vecLines, -2, axis=1)), axis=2)
+        coefficients = [np.einsum('u,knud->knd', SP.CATMULL_ROM_BASIS[c], control) for c in (1, 2, 3)]
+        # (K,N,2) u, u^2 and u^3 polynomial coefficients of every segment of every line, from the control
+        # points shaping it and the basis 'Spline' defines. The constant term is not needed for derivatives
+
+        u = ((np.arange(self.nSubSteps)[:, None] + 0.5 * (SP.GAUSS_LEGENDRE_NODES + 1.0)) / self.nSubSteps).ravel()
+        g = self.GetDerivatives([c[:, :, None] for c in coefficients], u[:, None])[0]
+        fSpeed = np.hypot(g[..., 0], g[..., 1]).reshape(nLines, nSegments * self.nSubSteps, len(SP.GAUSS_LEGENDRE_NODES))
+        fDistance = np.zeros((nLines, nSegments * self.nSubSteps + 1))
+        np.cumsum(fSpeed @ SP.GAUSS_LEGENDRE_WEIGHTS * (0.5 / self.nSubSteps), axis=1, out=fDistance[:, 1:])
+        # Distance along every line at nSubSteps even steps of 't' per segment, from Gauss-Legendre quadrature
+
+        fLength = fDistance[:, -1]
+        nSamples = np.maximum(np.ceil(fLength / self.fStep).astype(np.int64), 3)
+        fSampleStep = np.minimum(self.fStep, fLength / 3.0)
+        nMaxSamples = int(nSamples.max())
+        bValid = np.arange(nMaxSamples) < nSamples[:, None]
+        p = np.where(bValid, np.arange(nMaxSamples) * fSampleStep[:, None], np.inf)
+        # Every line is sampled every fSampleStep along its own length, so its profile does not depend on
+        # the other lines in the batch. Lines shorter than the longest are padded with samples at infinity
+
+        fOffset = (np.arange(nLines) * (fLength.max() + 1.0))[:, None]
+        j = np.searchsorted((fDistance + fOffset).ravel(), (np.minimum(p, fLength[:, None]) + fOffset).ravel(),
+                            side='right').reshape(p.shape) - 1
+        j = np.clip(j - np.arange(nLines)[:, None] * fDistance.shape[1], 0, fDistance.shape[1] - 2)
+        # One search through the tables of all the lines at once, each shifted clear of the one before
+
+        fStart = np.take_along_axis(fDistance, j, axis=1)
+        fEnd = np.take_along_axis(fDistance, j + 1, axis=1)
+        fRemaining = np.minimum(p, fLength[:, None]) - fStart
+        u = np.clip(np.divide(fRemaining, fEnd - fStart, out=np.zeros_like(fStart), where=fEnd > fStart), 0.0, 1.0)
+        # Guess for how far through its step of 't' every sample lies, linear in distance
+
+        i = j // self.nSubSteps
+        sampleCoefficients = [c[np.arange(nLines)[:, None], i] for c in coefficients]
+        uStart = (j % self.nSubSteps) / self.nSubSteps
+        fHalf = 0.5 * u / self.nSubSteps
+        g = self.GetDerivatives([c[..., None, :] for c in sampleCoefficients],
+                                uStart[..., None, None] + fHalf[..., None, None] * (NEWTON_NODES[:, None] + 1.0))[0]
+        fError = fHalf * (np.hypot(g[..., 0], g[..., 1]) @ NEWTON_WEIGHTS) - fRemaining
+        u = uStart + 2.0 * fHalf
+        g = self.GetDerivatives(sampleCoefficients, u[..., None])[0]
+        u = np.clip(u - np.divide(fError, np.hypot(g[..., 0], g[..., 1]), out=np.zeros_like(u), where=fError != 0.0),
+                    uStart, uStart + 1.0 / self.nSubSteps)
+        g, h = self.GetDerivatives(sampleCoefficients, u[..., None])
+        # One Newton step on the distance into the step, as in 'Spline.GetNormalisedOffsets', puts the
+        # samples at even distances whatever the speed along the segment
+        vecCurvature = (g[..., 0] * h[..., 1] - g[..., 1] * h[..., 0]) / np.maximum(np.hypot(g[..., 0], g[..., 1]) ** 3, 1e-300)
+        # Curvature is the rate the heading of the gradient turns per distance travelled. Catmull-Rom
+        # curvature jumps at the control points, which differencing headings between samples would smear
+
+        vecSpeedLimit = np.minimum(self.fMaxSpeed, np.sqrt(self.fMaxLateralAcceleration /
+                                                           np.maximum(np.abs(vecCurvature), 1e-12)))
+        vecSpeedLimit[~bValid] = np.inf
+        vecSpeed = self.GetSpeedProfile(vecSpeedLimit, np.minimum(p, fLength[:, None]), fLength)
+
+        nNext = np.where(np.arange(1, nMaxSamples + 1) < nSamples[:, None], np.arange(1, nMaxSamples + 1), 0)
+        fNextDistance = np.where(nNext > 0, np.take_along_axis(p, nNext, axis=1), fLength[:, None])
+        fStepTime = 2.0 * (fNextDistance - p) / np.maximum(vecSpeed + np.take_along_axis(vecSpeed, nNext, axis=1), 1e-12)
+        fLapTime = np.sum(np.where(bValid, fStepTime, 0.0), axis=1)
+        # Constant acceleration between samples, so each step takes its length over the mean of its end
+        # speeds. The last sample of a line steps back round to its first
+
+        vecCurvature[~bValid] = np.nan
+        vecSpeedLimit[~bValid] = np.nan
+        vecSpeed[~bValid] = np.nan
+        return LapProfile(fLapTime, np.where(bValid, p, np.nan), vecSpeed, vecSpeedLimit, vecCurvature)
+
+    def GetDerivatives(self, coefficients, u):
+        # First and second derivatives at local parameters u of segments with the given (..., 2) u, u^2
+        # and u^3 coefficients. u has a trailing axis of length one to broadcast against x and y
+        b, c, d = coefficients
+        return b + u * (2.0 * c + 3.0 * u * d), 2.0 * c + 6.0 * u * d
+
+    def GetSpeedProfile(self, vecSpeedLimit, vecDistance, fLength):
+        # Fastest speeds within the speed limits at the samples of looped lines, all (K,M) arrays. Speed
+        # squared can grow by at most 2 a ds over a distance ds, so the forward pass is the running
+        # minimum of v^2 - 2 a s plus 2 a s, and the backward pass the same for braking in reverse.
+        # Padding samples have an infinite speed limit, so they constrain nothing
+        nSamples = vecSpeedLimit.shape[1]
+        s = np.concatenate((vecDistance, vecDistance + fLength[:, None], vecDistance + 2.0 * fLength[:, None]), axis=1)
+        vSq = np.tile(vecSpeedLimit ** 2, 3)
+        # Three laps in a row, so the middle lap sees the lap before it and the lap after it
+
+        fAccelerate = 2.0 * self.fMaxAcceleration * s
+        fForward = np.minimum.accumulate(vSq - fAccelerate, axis=1) + fAccelerate
+
+        fBrake = 2.0 * self.fMaxBraking * s
+        fBackward = np.minimum.accumulate((vSq + fBrake)[:, ::-1], axis=1)[:, ::-1] - fBrake
+
+        return np.sqrt(np.minimum(fForward, fBackward)[:, nSamples:2 * nSamples])
@@ -3,6 +3,12 @@ import numpy as np
 import pygame
 from pygame.locals import *
 import Spline as SP
+import SpatialIndex as SI
+import CarFleet as CF
+import RacingLineWorker as RLW
+import FrameProfiler as FP
+import TrackCache as TC
+import Tracks
 
 class RacingLineGame:
     def __init__(self):
@@ -11,52 +17,114 @@ class RacingLineGame:
         self.trackLeft = SP.Spline()  # Spline object representing the left track boundary
         self.trackRight = SP.Spline()  # Spline object representing the right track boundary
         self.racingLine = SP.Spline()  # Spline object representing the racing line
+        self.worker = RLW.RacingLineWorker()  # Racing line optimizer, solving in the background between frames
+        self.nRacingLineVersion = 0  # Version of the worker snapshot the racing line was last taken from
+        self.cache = TC.TrackCache("racing_line_cache")  # Solved racing lines and spline tables of tracks seen before
+        self.bMinimumCurvature = False  # Solve directly for the minimum curvature line
+        self.fCurvatureBlend = 1.0  # Weight of curvature against path length in the minimum curvature solve
         self.nNodes = 20  # Number of nodes on the track
-        self.fDisplacement = [0] * self.nNodes  # Displacement of each node on the racing line
-        self.nIterations = 1  # Number of iterations for the racing line optimization
+        self.nIterations = 1  # Maximum number of iterations per snapshot for the racing line optimization
+        self.m_sAppName = "Racing Line Game"  # Name shown in the window caption
+        self.nFrameRate = 60  # Frames rendered per second
+        self.fMaxElapsedTime = 0.1  # Longest time step taken in one frame, so a stall cannot spiral
+        self.setKeysHeld = set()  # Keys held down last time they were checked, for detecting key presses
         self.fMarker = 1.0  # Marker for the position on the racing line
         self.nSelectedNode = -1  # Index of the selected node
+        self.nodeIndex = SI.PointGrid()  # Grid over the path's control points, for picking nodes with the mouse
         self.vecModelCar = [[2, 0], [0, -1], [0, 1]]  # Model for drawing the car
+        self.fleet = CF.CarFleet()  # Cars driving the racing line together in fleet mode
+        self.bFleetMode = False  # Drive a whole fleet of cars instead of the single car
+        self.nFleetCars = 2000  # Number of cars in the fleet
         self.font_width = 8  # Set the font width
         self.font_height = 8  # Set the font height
         self.screen = None  # Pygame screen object
         self.font = None  # Pygame font object
         self.clock = None  # Pygame clock object
         self.fElapsed = 0.0  # Elapsed time since the last frame
+        self.fTrackWidth = 10.0  # Half width of the track either side of the path
+        self.surfTrackLayer = None  # Offscreen surface holding the rendered track, centre line and nodes
+        self.bTrackLayerDirty = True  # True when the whole track layer has to be rendered again
+        self.listDirtyRects = []  # Regions of the track layer to render again on the next frame
+        self.drawTarget = None  # Surface that Fill, Draw and DrawWireFrameModel draw onto
+        self.dictGlyphCache = {}  # Rendered character surfaces, keyed by character and color
+        self.bAntialias = False  # Draw one pixel wide spline lines antialiased
+        self.nLineWidth = 1  # Width in pixels of the centre line and racing line
+        self.colCentreLine = 0x000F  # Color of the centre line
+        self.colRacingLine = 0x000F  # Color of the racing line
+        self.fTessellationTolerance = 0.25  # Furthest in pixels drawn lines and track edges stray from their splines
+        self.profiler = FP.FrameProfiler()  # Times every phase of a frame
+        self.bShowProfiler = False  # Show the frame profiler overlay
+        self.sTraceFileName = "frame_trace.json"  # File the frame profiler's Chrome trace is saved to
+        self.hudFont = None  # Pygame font object for the overlay text
 
     def ConstructConsole(self, width, height, font_width, font_height):
         # Initialize the Pygame console window
         pygame.init()
         self.screen = pygame.display.set_mode((width * font_width, height * font_height))
         self.font = pygame.font.Font(None, font_height)
+        self.dictGlyphCache = {}
+        self.hudFont = pygame.font.Font(None, 16)
         self.clock = pygame.time.Clock()
         self.fElapsed = 0.0
+        self.drawTarget = self.screen
 
     def Start(self):
-        # Start the game loop
+        # Start the game loop. Frames are rendered at a fixed rate while the racing line is solved on
+        # the worker thread, so an expensive solve never holds up a frame
+        self.worker.fPublishInterval = 1.0 / self.nFrameRate
+        self.worker.Start()
+
         bGameRunning = True
         while bGameRunning:
             for event in pygame.event.get():
                 if event.type == QUIT:
                     bGameRunning = False
 
-            self.fElapsed += self.clock.tick() / 1000.0
-            if self.fElapsed > 0.0333:
-                self.fElapsed -= 0.0333
+            # Wait for the next frame, never stepping the simulation by more than fMaxElapsedTime at once
+            self.fElapsed = min(self.clock.tick(self.nFrameRate) / 1000.0, self.fMaxElapsedTime)
 
-                self.OnUserUpdate(self.fElapsed)
-                pygame.display.set_caption(self.m_sAppName + " - FPS: " + str(int(self.clock.get_fps())))
-                pygame.display.flip()
+            self.OnUserUpdate(self.fElapsed)
+            pygame.display.set_caption(self.GetCaption())
+            pygame.display.flip()
 
+        self.worker.Stop()
+        self.SaveRacingLine()  # Keep the racing line even if it never settled, such as a relaxation still oscillating
         pygame.quit()
 
+    def GetCaption(self):
+        # Window caption showing the current FPS and the state of the racing line optimizer
+        snapshot = self.worker.snapshot
+        return (self.m_sAppName + " - FPS: " + str(int(self.clock.get_fps())) +
+                " - Iterations: " + str(snapshot.nIterationsRun) +
+                " - Residual: " + format(snapshot.fResidual, ".5f") +
+                " - Lap: " + format(snapshot.fLapTime, ".2f") + "s" +
+                (" - Cars: " + str(self.fleet.GetCarCount()) if self.bFleetMode else ""))
+
     def Fill(self, x1, y1, x2, y2, color):
         # Fill a rectangle with the specified color on the screen
-        pygame.draw.rect(self.screen, color, pygame.Rect(x1, y1, x2 - x1, y2 - y1))
+        pygame.draw.rect(self.drawTarget, color, pygame.Rect(x1, y1, x2 - x1, y2 - y1))
 
     def Draw(self, x, y, c, col):
-        # Draw a character with the specified color at the given position on the screen
-        self.screen.blit(self.font.render(c, True, col), (x * self.font_width, y * self.font_height))
+        # Draw a character with the specified color at the given position on the screen,
+        # rendering each character and color pair only once
+        glyph = self.dictGlyphCache.get((c, col))
+        if glyph is None:
+            glyph = self.dictGlyphCache[(c, col)] = self.font.render(c, True, col)
+        self.drawTarget.blit(glyph, (x * self.font_width, y * self.font_height))
+
+    def DrawPolyline(self, points, col, nLineWidth=1, bClosed=False):
+        # Draw a whole (N,2) array of points, in character cells like Draw, as one connected line
+        points = (np.asarray(points) * (self.font_width, self.font_height)).tolist()
+        if len(points) < 2:
+            return
+        if self.bAntialias and nLineWidth <= 1:
+            pygame.draw.aalines(self.drawTarget, col, bClosed, points)
+        else:
+            pygame.draw.lines(self.drawTarget, col, bClosed, points, nLineWidth)
+
+    def GetTessellationTolerance(self):
+        # The pixel tolerance in track units, so splines are drawn equally smooth at any scale
+        return self.fTessellationTolerance / max(self.font_width, self.font_height)
 
     def GetMouseX(self):
         # Get the x-coordinate of the mouse cursor
@@ -68,49 +136,164 @@ class RacingLineGame:
 
     def DrawWireFrameModel(self, model, x, y, angle, scale, color):
         # Draw a wireframe model at the given position with the specified angle, scale, and color
-        for i in range(len(model)):
-            x1 = model[i][0] * scale
-            y1 = model[i][1] * scale
-            x2 = model[(i + 1) % len(model)][0] * scale
-            y2 = model[(i + 1) % len(model)][1] * scale
-
-            x1r = math.cos(angle) * x1 - math.sin(angle) * y1
-            y1r = math.sin(angle) * x1 + math.cos(angle) * y1
-            x2r = math.cos(angle) * x2 - math.sin(angle) * y2
-            y2r = math.sin(angle) * x2 + math.cos(angle) * y2
+        self.DrawWireFrameModels(CF.TransformModels(model, (x, y), (math.cos(angle), math.sin(angle)), scale), color)
 
-            x1r += x
-            y1r += y
-            x2r += x
-            y2r += y
-
-            pygame.draw.line(self.screen, color, (x1r, y1r), (x2r, y2r))
+    def DrawWireFrameModels(self, vecModels, color):
+        # Draw every already transformed model of an (N,V,2) array as a closed outline
+        for vertices in vecModels.tolist():
+            pygame.draw.lines(self.drawTarget, color, True, vertices)
 
     def OnUserCreate(self):
         # Initialize the game state
-        for i in range(self.nNodes):
-            self.trackLeft.points.append([0.0, 0.0, 0.0])
-            self.trackRight.points.append([0.0, 0.0, 0.0])
-            self.racingLine.points.append([0.0, 0.0, 0.0])
-
         # A handcrafted track
-        self.path.points = [
-            [81.8, 195.0, 0.0], [108.0, 210.0, 0.0], [152.0, 216.0, 0.0],
-            [182.0, 185.6, 0.0], [190.0, 159.0, 0.0], [198.0, 122.0, 0.0], [226.0, 93.0, 0.0],
-            [224.0, 41.0, 0.0], [204.0, 15.0, 0.0], [158.0, 24.0, 0.0], [146.0, 52.0, 0.0],
-            [157.0, 93.0, 0.0], [124.0, 129.0, 0.0], [83.0, 104.0, 0.0], [77.0, 62.0, 0.0],
-            [40.0, 57.0, 0.0], [21.0, 83.0, 0.0], [33.0, 145.0, 0.0], [30.0, 198.0, 0.0],
-            [48.0, 210.0, 0.0]
-        ]
+        self.path.SetPoints(Tracks.HANDCRAFTED_TRACK)
 
         self.vecModelCar = [[2, 0], [0, -1], [0, 1]]
 
-        self.path.UpdateSplineProperties()
+        # Load the track's segment lengths and tessellation if it has been opened before
+        if not self.cache.LoadSpline(self.path, self.GetTessellationTolerance()):
+            self.path.UpdateSplineProperties()
+            self.cache.SaveSpline(self.path, self.GetTessellationTolerance())
+        self.nodeIndex.Build(self.path.vecPoints)
+
+        # Start the racing line on the centre line, or on the line last solved for this track
+        self.worker.fTessellationTolerance = self.GetTessellationTolerance()
+        self.worker.SetOptions(fTrackWidth=self.fTrackWidth)
+        self.worker.SetTrackFromSpline(self.path)
+        cached = self.cache.Load(self.GetRacingLineCacheKey(), ['displacement'])
+        if cached is not None:
+            self.worker.SetDisplacement(cached['displacement'])
+        self.racingLine.SetPoints(self.path.vecPoints)
+        self.racingLine.UpdateSplineProperties()
+
+    def OptimiseRacingLine(self):
+        # Without the worker thread running, do the worker's share of the solve here
+        if not self.worker.IsRunning():
+            self.worker.Step()
+
+        # Take the latest finished racing line from the worker
+        snapshot = self.worker.snapshot
+        if snapshot.nVersion != self.nRacingLineVersion:
+            self.nRacingLineVersion = snapshot.nVersion
+            self.racingLine = snapshot.racingLine
+
+            if snapshot.bConverged and self.nSelectedNode < 0:
+                self.SaveRacingLine()
+
+    def SaveRacingLine(self):
+        # Remember the latest racing line for the next time this track is opened. The worker may still
+        # be behind the latest edit, but a cached line is only ever a starting point for the solve
+        snapshot = self.worker.snapshot
+        if len(snapshot.vecDisplacement) == len(self.path.vecPoints):
+            self.cache.Save(self.GetRacingLineCacheKey(), dict(displacement=snapshot.vecDisplacement))
+
+    def GetRacingLineCacheKey(self):
+        # Cache key of the racing line of the current track with the current solver settings
+        return self.cache.GetKey('racing_line', self.path.vecPoints, track_width=self.fTrackWidth,
+                                 minimum_curvature=self.bMinimumCurvature, curvature_blend=self.fCurvatureBlend)
+
+    def SetTrackWidth(self, fTrackWidth):
+        # Change the track width, which changes the whole track layer and frees the racing line to move again
+        self.fTrackWidth = fTrackWidth
+        self.worker.SetOptions(fTrackWidth=fTrackWidth)
+        self.bTrackLayerDirty = True
+
+    def UpdateTrackBoundaries(self, nodes=None):
+        # Calculate track boundary points, all of them, or only the ones next to the given moved control points
+        with self.profiler.Phase('track boundaries'):
+            nPoints = len(self.path.vecPoints)
+            bAll = nodes is None or len(self.trackLeft.vecPoints) != nPoints
+            if bAll:
+                t = np.arange(nPoints)
+            else:
+                t = np.unique((np.fromiter(nodes, dtype=np.int64)[:, None] + np.arange(-1, 2)) % nPoints)
+                # A boundary point sits at its control point, pushed out along the normal there, which
+                # depends on the control points either side
+            p1 = self.path.GetSplinePoints(t.astype(np.float64))
+            g1 = self.path.GetSplineGradients(t.astype(np.float64))
+            g1 /= np.hypot(g1[:, 0], g1[:, 1])[:, None]
+            normal = np.column_stack((-g1[:, 1], g1[:, 0]))
+
+            if bAll:
+                self.trackLeft.SetPoints(p1 + self.fTrackWidth * normal, bCopy=False)
+                self.trackRight.SetPoints(p1 - self.fTrackWidth * normal, bCopy=False)
+            else:
+                for i, (xl, yl), (xr, yr) in zip(t.tolist(), (p1 + self.fTrackWidth * normal).tolist(),
+                                                 (p1 - self.fTrackWidth * normal).tolist()):
+                    self.trackLeft.SetControlPoint(i, xl, yl)
+                    self.trackRight.SetControlPoint(i, xr, yr)
+                # Moved with 'SetControlPoint', so the boundaries keep their tessellation outside the edit
+
+    def GetTrackDirtyRects(self, nNode):
+        # Screen regions covered by the track, centre line and node markers around a control point.
+        # The boundary segments within three nodes of it are the ones that can change when it moves
+        if self.bTrackLayerDirty:
+            return []  # The whole layer is rendered again anyway, and the boundaries may not exist yet
+        t = len(self.path.vecPoints) + nNode + np.linspace(-3.0, 3.0, 61)
+        vecTrack = np.vstack((self.trackLeft.GetSplinePoints(t), self.trackRight.GetSplinePoints(t),
+                              self.path.vecPoints[nNode:nNode + 1]))
+        vecLine = self.path.GetSplinePoints(t) * (self.font_width, self.font_height)
+
+        nGlyph = max(self.font.size(chr(0x2588))) + max(self.font_width, self.font_height) + self.nLineWidth
+        listRects = []
+        for vec, nPad in ((vecTrack, 3), (vecLine, nGlyph)):
+            x1, y1 = np.floor(vec.min(axis=0)).astype(int) - nPad
+            x2, y2 = np.ceil(vec.max(axis=0)).astype(int) + nPad
+            listRects.append(pygame.Rect(int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
+        return listRects
+
+    def RenderTrackLayer(self, rect=None):
+        # Render the static parts of the scene into the offscreen track layer, only inside 'rect' if given
+        if self.surfTrackLayer is None:
+            self.surfTrackLayer = pygame.Surface(self.screen.get_size()).convert()
+
+        self.surfTrackLayer.set_clip(rect)
+        self.drawTarget = self.surfTrackLayer
+
+        # Clear the layer
+        self.Fill(0, 0, self.surfTrackLayer.get_width(), self.surfTrackLayer.get_height(), (0, 55, 0))
+
+        # Draw Track, as quads between both edges at every vertex of either edge's tessellation
+        fTolerance = self.GetTessellationTolerance()
+        t = np.union1d(self.trackLeft.GetTessellation(fTolerance)[0], self.trackRight.GetTessellation(fTolerance)[0])
+        tNext = np.append(t[1:], t[0] + len(self.path.vecPoints))
+        pl1 = self.trackLeft.GetSplinePoints(t)
+        pr1 = self.trackRight.GetSplinePoints(t)
+        pl2 = self.trackLeft.GetSplinePoints(tNext)
+        pr2 = self.trackRight.GetSplinePoints(tNext)
+
+        if rect is not None:
+            # Only the quads touching the region need to be drawn again
+            quad = np.stack((pl1, pr1, pl2, pr2))
+            lo, hi = quad.min(axis=0), quad.max(axis=0)
+            bInside = ((hi[:, 0] >= rect.left) & (lo[:, 0] <= rect.right) &
+                       (hi[:, 1] >= rect.top) & (lo[:, 1] <= rect.bottom))
+            pl1, pr1, pl2, pr2 = pl1[bInside], pr1[bInside], pl2[bInside], pr2[bInside]
+
+        pl1, pr1, pl2, pr2 = pl1.tolist(), pr1.tolist(), pl2.tolist(), pr2.tolist()
+        for i in range(len(pl1)):
+            pygame.draw.polygon(self.drawTarget, (128, 128, 128), [pl1[i], pr1[i], pr2[i]])
+            pygame.draw.polygon(self.drawTarget, (128, 128, 128), [pl1[i], pl2[i], pr2[i]])
+
+        self.path.DrawSelf(self, 0, 0, col=self.colCentreLine, nLineWidth=self.nLineWidth, fTolerance=fTolerance)
+
+        for i in self.path.vecPoints.tolist():
+            self.Fill(i[0] - 1, i[1] - 1, i[0] + 2, i[1] + 2, (255, 0, 0))
+
+        self.surfTrackLayer.set_clip(None)
+        self.drawTarget = self.screen
 
-    def OnUserUpdate(self, fElapsedTime):
-        # Clear the screen
-        self.Fill(0, 0, self.screen.get_width(), self.screen.get_height(), (0, 55, 0))
+    def KeyPressed(self, key):
+        # True only on the frame a key goes down, so holding it does not repeat the action
+        bHeld = pygame.key.get_pressed()[key]
+        bPressed = bHeld and key not in self.setKeysHeld
+        if bHeld:
+            self.setKeysHeld.add(key)
+        else:
+            self.setKeysHeld.discard(key)
+        return bPressed
 
+    def HandleInput(self):
         # Handle iteration count
         if pygame.key.get_pressed()[pygame.K_w]:
             self.nIterations += 1
@@ -118,123 +301,124 @@ class RacingLineGame:
             self.nIterations -= 1
         if self.nIterations < 0:
             self.nIterations = 0
+        if self.nIterations != self.worker.nIterations:
+            self.worker.SetIterations(self.nIterations)
+
+        # Toggle the minimum curvature solve, and change its blend between curvature and path length
+        if self.KeyPressed(K_m):
+            self.bMinimumCurvature = not self.bMinimumCurvature
+            self.worker.SetOptions(bMinimumCurvature=self.bMinimumCurvature)
+        if pygame.key.get_pressed()[K_x] and self.fCurvatureBlend < 1.0:
+            self.fCurvatureBlend = min(self.fCurvatureBlend + 0.01, 1.0)
+            self.worker.SetOptions(fCurvatureBlend=self.fCurvatureBlend)
+        if pygame.key.get_pressed()[K_z] and self.fCurvatureBlend > 0.0:
+            self.fCurvatureBlend = max(self.fCurvatureBlend - 0.01, 0.0)
+            self.worker.SetOptions(fCurvatureBlend=self.fCurvatureBlend)
+
+        # Handle track width
+        if pygame.key.get_pressed()[K_e]:
+            self.SetTrackWidth(self.fTrackWidth + 0.1)
+        if pygame.key.get_pressed()[K_q] and self.fTrackWidth > 1.0:
+            self.SetTrackWidth(self.fTrackWidth - 0.1)
+
+        # Show the frame profiler overlay, and save the recorded frames as a Chrome trace
+        if self.KeyPressed(K_F1):
+            self.bShowProfiler = not self.bShowProfiler
+        if self.KeyPressed(K_F2):
+            self.profiler.ExportChromeTrace(self.sTraceFileName)
+
+        # Switch between the single car and a fleet of cars spread around the racing line
+        if self.KeyPressed(K_f):
+            self.bFleetMode = not self.bFleetMode
+            if self.bFleetMode:
+                self.fleet.Reset(self.nFleetCars, self.racingLine.fTotalSplineLength)
 
         # Check if node is selected with the mouse
-        if pygame.mouse.get_pressed()[0]:
-            for i in range(len(self.path.points)):
-                d = math.sqrt(
-                    (self.path.points[i][0] - self.GetMouseX()) ** 2 +
-                    (self.path.points[i][1] - self.GetMouseY()) ** 2
-                )
-                if d < 5.0:
-                    self.nSelectedNode = i
-                    break
-
-        if not pygame.mouse.get_pressed()[0]:
+        bMouseDown = pygame.mouse.get_pressed()[0]
+        nMouseX = self.GetMouseX()
+        nMouseY = self.GetMouseY()
+        if bMouseDown:
+            nNearest, fDistance = self.nodeIndex.NearestPoint(nMouseX, nMouseY)
+            if fDistance < 5.0:
+                self.nSelectedNode = nNearest
+        else:
             self.nSelectedNode = -1
 
-        # Move the selected node
-        if pygame.mouse.get_pressed()[0] and self.nSelectedNode >= 0:
-            self.path.points[self.nSelectedNode][0] = self.GetMouseX()
-            self.path.points[self.nSelectedNode][1] = self.GetMouseY()
+        # Move the selected node, marking the track layer dirty where it was and where it now is
+        if (bMouseDown and self.nSelectedNode >= 0 and
+                (nMouseX, nMouseY) != tuple(self.path.vecPoints[self.nSelectedNode])):
+            self.listDirtyRects += self.GetTrackDirtyRects(self.nSelectedNode)
+            self.path.SetControlPoint(self.nSelectedNode, nMouseX, nMouseY)
             self.path.UpdateSplineProperties()
+            self.nodeIndex.Update(self.nSelectedNode, self.path.vecPoints[self.nSelectedNode])
+            self.UpdateTrackBoundaries([self.nSelectedNode])
+            self.listDirtyRects += self.GetTrackDirtyRects(self.nSelectedNode)
+
+            # Only the racing line nodes whose centre line normal moved start again from the centre line
+            self.worker.SetTrackFromSpline(self.path, range(self.nSelectedNode - 2, self.nSelectedNode + 3))
+
+    def DrawTrack(self):
+        # Draw the cached track layer, rendering it again only where the track changed
+        if self.bTrackLayerDirty:
+            self.UpdateTrackBoundaries()
+            self.RenderTrackLayer()
+        else:
+            for rect in self.listDirtyRects:
+                self.RenderTrackLayer(rect)
+        self.bTrackLayerDirty = False
+        self.listDirtyRects = []
+        self.screen.blit(self.surfTrackLayer, (0, 0))
+
+    def DrawCar(self, fElapsedTime):
+        if self.bFleetMode:
+            self.DrawFleet(fElapsedTime)
+            return
 
         # Move the car around the racing line
         self.fMarker += 2.0 * fElapsedTime
         if self.fMarker >= self.racingLine.fTotalSplineLength:
             self.fMarker -= self.racingLine.fTotalSplineLength
 
-        # Calculate track boundary points
-        fTrackWidth = 10.0
-        for i in range(len(self.path.points)):
-            p1 = self.path.GetSplinePoint(i)
-            g1 = self.path.GetSplineGradient(i)
-            glen = math.sqrt(g1[0] * g1[0] + g1[1] * g1[1])
-
-            self.trackLeft.points[i][0] = p1[0] + fTrackWidth * (-g1[1] / glen)
-            self.trackLeft.points[i][1] = p1[1] + fTrackWidth * (g1[0] / glen)
-            self.trackRight.points[i][0] = p1[0] - fTrackWidth * (-g1[1] / glen)
-            self.trackRight.points[i][1] = p1[1] - fTrackWidth * (g1[0] / glen)
-
-        # Draw Track
-        fRes = 0.2
-        for t in np.arange(0.0, len(self.path.points), fRes):
-            pl1 = self.trackLeft.GetSplinePoint(t)
-            pr1 = self.trackRight.GetSplinePoint(t)
-            pl2 = self.trackLeft.GetSplinePoint(t + fRes)
-            pr2 = self.trackRight.GetSplinePoint(t + fRes)
-
-            pygame.draw.polygon(self.screen, (128, 128, 128), [(pl1[0], pl1[1]), (pr1[0], pr1[1]), (pr2[0], pr2[1])])
-            pygame.draw.polygon(self.screen, (128, 128, 128), [(pl1[0], pl1[1]), (pl2[0], pl2[1]), (pr2[0], pr2[1])])
-
-        # Reset the racing line
-        for i in range(len(self.racingLine.points)):
-            self.racingLine.points[i] = self.path.points[i][:]
-            self.fDisplacement[i] = 0.0
-        self.racingLine.UpdateSplineProperties()
+        fCarOffset = self.racingLine.GetNormalisedOffset(self.fMarker)
+        car_p = self.racingLine.GetSplinePoint(fCarOffset)
+        car_g = self.racingLine.GetSplineGradient(fCarOffset)
+        self.DrawWireFrameModel(self.vecModelCar, car_p[0], car_p[1], math.atan2(car_g[1], car_g[0]), 3.0, (0, 0, 0))
 
-        for n in range(self.nIterations):
-            for i in range(len(self.racingLine.points)):
-                # Get locations of neighbor nodes
-                pointRight = self.racingLine.points[(i + 1) % len(self.racingLine.points)]
-                pointLeft = self.racingLine.points[(i + len(self.racingLine.points) - 1) % len(self.racingLine.points)]
-                pointMiddle = self.racingLine.points[i]
-
-                # Create vectors to neighbors
-                vectorLeft = [pointLeft[0] - pointMiddle[0], pointLeft[1] - pointMiddle[1]]
-                vectorRight = [pointRight[0] - pointMiddle[0], pointRight[1] - pointMiddle[1]]
-
-                # Normalize neighbors
-                lengthLeft = math.sqrt(vectorLeft[0] * vectorLeft[0] + vectorLeft[1] * vectorLeft[1])
-                leftn = [vectorLeft[0] / lengthLeft, vectorLeft[1] / lengthLeft]
-                lengthRight = math.sqrt(vectorRight[0] * vectorRight[0] + vectorRight[1] * vectorRight[1])
-                rightn = [vectorRight[0] / lengthRight, vectorRight[1] / lengthRight]
-
-                # Add together to create bisector vector
-                vectorSum = [rightn[0] + leftn[0], rightn[1] + leftn[1]]
-                glen = math.sqrt(vectorSum[0] * vectorSum[0] + vectorSum[1] * vectorSum[1])
-                vectorSum[0] /= glen
-                vectorSum[1] /= glen
-
-                # Get point gradient and normalize
-                g = self.path.GetSplineGradient(i)
-                glen = math.sqrt(g[0] * g[0] + g[1] * g[1])
-                g[0] /= glen
-                g[1] /= glen
-
-                # Project required correction onto point tangent to give displacement
-                dp = -g[1] * vectorSum[0] + g[0] * vectorSum[1]
-
-                # Shortest path
-                self.fDisplacement[i] += dp * 0.3
-
-                # Curvature
-                # self.fDisplacement[(i + 1) % len(self.racingLine.points)] += dp * -0.2
-                # self.fDisplacement[(i - 1 + len(self.racingLine.points)) % len(self.racingLine.points)] += dp * -0.2
-
-            # Clamp displaced points to track width
-            for i in range(len(self.racingLine.points)):
-                if self.fDisplacement[i] >= fTrackWidth:
-                    self.fDisplacement[i] = fTrackWidth
-                if self.fDisplacement[i] <= -fTrackWidth:
-                    self.fDisplacement[i] = -fTrackWidth
-
-                g = self.path.GetSplineGradient(i)
-                glen = math.sqrt(g[0] * g[0] + g[1] * g[1])
-                g[0] /= glen
-                g[1] /= glen
-
-                self.racingLine.points[i][0] = self.path.points[i][0] + -g[1] * self.fDisplacement[i]
-                self.racingLine.points[i][1] = self.path.points[i][1] + g[0] * self.fDisplacement[i]
-
-
-        self.path.DrawSelf(self, 0, 0)
-        self.racingLine.UpdateSplineProperties()
-        self.racingLine.DrawSelf(self, 0, 0)
+    def DrawFleet(self, fElapsedTime):
+        # Move every car of the fleet around the racing line in one step, then draw them all
+        with self.profiler.Phase('fleet step'):
+            self.fleet.Step(fElapsedTime, self.racingLine)
+            vecModels = self.fleet.GetModels(self.vecModelCar, 3.0)
 
-        for i in self.path.points:
-            self.Fill(i[0] - 1, i[1] - 1, i[0] + 2, i[1] + 2, (255, 0, 0))
+        with self.profiler.Phase('fleet draw'):
+            self.DrawWireFrameModels(vecModels, (0, 0, 0))
 
-        car_p = self.racingLine.GetSplinePoint(self.fMarker)
-        car_g = self.racingLine.GetSplineGradient(self.fMarker)
-        self.DrawWireFrameModel(self.vecModelCar, car_p[0], car_p[1], math.atan2(car_g[1], car_g[0]), 3.0, (0, 0, 0))
+    def DrawProfilerOverlay(self):
+        # Rolling p50 and p99 of every frame phase, in the top left corner of the screen
+        y = 4
+        for sLine in self.profiler.GetOverlayLines():
+            text = self.hudFont.render(sLine, True, (255, 255, 255), (0, 0, 0))
+            self.screen.blit(text, (4, y))
+            y += text.get_height()
+
+    def OnUserUpdate(self, fElapsedTime):
+        with self.profiler.Phase('frame'):
+            with self.profiler.Phase('input'):
+                self.HandleInput()
+
+            with self.profiler.Phase('track draw'):
+                self.DrawTrack()
+
+            # Relax the racing line, carrying on from where the previous frame stopped
+            with self.profiler.Phase('optimizer'):
+                self.OptimiseRacingLine()
+
+            with self.profiler.Phase('DrawSelf'):
+                self.racingLine.DrawSelf(self, 0, 0, col=self.colRacingLine, nLineWidth=self.nLineWidth,
+                                         fTolerance=self.GetTessellationTolerance())
+
+            with self.profiler.Phase('car'):
+                self.DrawCar(fElapsedTime)
+
+        if self.bShowProfiler:
+            self.DrawProfilerOverlay()
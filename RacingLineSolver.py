@@ -0,0 +1,289 @@
+import math
+import numpy as np
+
+# Racing line optimizers working on whole (N,2) arrays of nodes at once: the iterative shortest path
+# relaxation, and a direct minimum curvature solve.
+
+def CholeskyBanded(d0, d1, d2):
+    l0 = [0.0] * len(d0)
+    l1 = [0.0] * len(d0)
+    l2 = [0.0] * len(d0)
+    # Cholesky factor of a symmetric positive definite pentadiagonal matrix, stored by diagonal:
+    # l0[i] = L[i][i], l1[i] = L[i][i - 1] and l2[i] = L[i][i - 2]
+
+    for i in range(len(d0)):
+        if i >= 2:
+            l2[i] = d2[i - 2] / l0[i - 2]
+        if i >= 1:
+            l1[i] = (d1[i - 1] - l2[i] * l1[i - 1]) / l0[i - 1]
+        l0[i] = math.sqrt(d0[i] - l1[i] * l1[i] - l2[i] * l2[i])
+
+    return l0, l1, l2
+
+def SolveCholeskyBanded(l0, l1, l2, b):
+    n = len(l0)
+    y = [0.0] * n
+    x = [0.0] * n
+
+    for i in range(n):
+        y[i] = (b[i] - (l1[i] * y[i - 1] if i >= 1 else 0.0) - (l2[i] * y[i - 2] if i >= 2 else 0.0)) / l0[i]
+        # Forward substitution with L
+
+    for i in range(n - 1, -1, -1):
+        x[i] = (y[i] - (l1[i + 1] * x[i + 1] if i + 1 < n else 0.0) - (l2[i + 2] * x[i + 2] if i + 2 < n else 0.0)) / l0[i]
+        # Back substitution with L transposed
+
+    return x
+
+def CyclicBandedMatVec(d0, d1, d2, x):
+    return (d0 * x + d1 * np.roll(x, -1) + np.roll(d1 * x, 1) +
+            d2 * np.roll(x, -2) + np.roll(d2 * x, 2))
+    # Multiply by the symmetric cyclic pentadiagonal matrix with A[i][i] = d0[i],
+    # A[i][i + 1] = d1[i] and A[i][i + 2] = d2[i], indices wrapping around
+
+def CyclicBandedDense(d0, d1, d2):
+    n = len(d0)
+    A = np.diag(np.asarray(d0, dtype=np.float64))
+    i = np.arange(n)
+    for k, d in ((1, d1), (2, d2)):
+        np.add.at(A, (i, (i + k) % n), d)
+        np.add.at(A, ((i + k) % n, i), d)
+    return A
+    # Dense copy of the same cyclic pentadiagonal matrix, only used for very small tracks
+
+def SolveCyclicBanded(d0, d1, d2, b):
+    n = len(d0)
+    if n < 8:
+        return np.linalg.solve(CyclicBandedDense(d0, d1, d2), b)
+        # Too few nodes for the bands not to overlap themselves around the loop
+
+    m = n - 2
+    # The first m nodes form an ordinary pentadiagonal block, the last two nodes close the loop and
+    # are eliminated through their 2x2 Schur complement
+
+    A12 = np.zeros((m, 2))
+    A12[m - 2, 0] = d2[m - 2]
+    A12[m - 1, 0] = d1[m - 1]
+    A12[m - 1, 1] = d2[m - 1]
+    A12[0, 0] = d2[n - 2]
+    A12[0, 1] = d1[n - 1]
+    A12[1, 1] = d2[n - 1]
+    A22 = np.array([[d0[n - 2], d1[n - 2]], [d1[n - 2], d0[n - 1]]])
+    # Couplings between the interior block and the two closing nodes
+
+    l0, l1, l2 = CholeskyBanded(d0[:m].tolist(), d1[:m].tolist(), d2[:m].tolist())
+    z = np.array(SolveCholeskyBanded(l0, l1, l2, b[:m].tolist()))
+    Y = np.column_stack([SolveCholeskyBanded(l0, l1, l2, A12[:, k].tolist()) for k in range(2)])
+    # Solve the interior block against the right hand side and against the coupling columns
+
+    x2 = np.linalg.solve(A22 - A12.T @ Y, b[m:] - A12.T @ z)
+    return np.concatenate((z - Y @ x2, x2))
+
+class RacingLineSolver:
+    def __init__(self, fTrackWidth=10.0, fStepSize=0.3, fTolerance=1e-4):
+        self.vecCentre = np.zeros((0, 2))
+        # Centre line node positions
+        self.vecNormal = np.zeros((0, 2))
+        # Unit normal of the centre line at every node, cached once per track
+        self.vecDisplacement = np.zeros(0)
+        # Displacement of every racing line node along its normal
+        self.vecRacingLine = np.zeros((0, 2))
+        # Racing line node positions
+        self.fTrackWidth = fTrackWidth
+        # Displacements are clamped to +/- the track width
+        self.fStepSize = fStepSize
+        # Fraction of the bisector correction applied every iteration
+        self.bAdaptiveStep = True
+        # Halve the step of a node whenever its correction changes direction, and let it grow back towards
+        # fStepSize while it does not, so the relaxation settles instead of bouncing around the shortest
+        # path for ever. False keeps the legacy fixed step of fStepSize
+        self.vecStep = np.zeros(0)
+        # Current step of every node with the adaptive step
+        self.vecPreviousCorrection = np.zeros(0)
+        # Correction of every node in the last iteration, to spot the nodes that changed direction
+        self.fTolerance = fTolerance
+        # Displacement change below which the racing line counts as converged
+        self.nIterationsRun = 0
+        # Number of iterations run by the last call to 'Solve'
+        self.fResidual = 0.0
+        # Largest displacement change in the last iteration run
+        self.bConverged = False
+        # True once the racing line has stopped moving
+        self.bMinimumCurvature = False
+        # Solve directly for the minimum curvature line instead of iterating the shortest path relaxation
+        self.fCurvatureBlend = 1.0
+        # Weight of curvature against path length in the minimum curvature solve, from 0.0 to 1.0
+        self.nMaxNewtonIterations = 100
+        # Limit on the number of projected Newton steps in the minimum curvature solve
+
+    def SetTrack(self, vecCentre, vecGradient):
+        vecCentre = np.asarray(vecCentre, dtype=np.float64)
+        vecGradient = np.asarray(vecGradient, dtype=np.float64)
+        # Centre line nodes and the spline gradient at each of them
+
+        g = vecGradient / np.hypot(vecGradient[:, 0], vecGradient[:, 1])[:, None]
+        self.vecNormal = np.column_stack((-g[:, 1], g[:, 0]))
+        # Normalise the gradients and rotate them by 90 degrees to get the normals
+
+        if len(vecCentre) != len(self.vecDisplacement):
+            # A different number of nodes means a new track, so start on the centre line
+            self.vecDisplacement = np.zeros(len(vecCentre))
+
+        self.vecCentre = vecCentre.copy()
+        self.UpdateRacingLine()
+        self.ResetSteps()
+        self.bConverged = False
+
+    def SetTrackFromSpline(self, path):
+        t = np.arange(len(path.vecPoints), dtype=np.float64)
+        self.SetTrack(path.GetSplinePoints(t), path.GetSplineGradients(t))
+        # Use a looped spline's control points as the centre line nodes
+
+    def ResetNodes(self, nodes=None):
+        if nodes is None:
+            # Put every node back on the centre line
+            self.vecDisplacement[:] = 0.0
+        else:
+            # Put the given nodes back on the centre line, wrapping indices around the lap
+            nodes = np.asarray(list(nodes), dtype=np.int64) % len(self.vecDisplacement)
+            self.vecDisplacement[nodes] = 0.0
+
+        self.UpdateRacingLine()
+        self.ResetSteps()
+        self.bConverged = False
+
+    def ResetSteps(self):
+        self.vecStep = np.zeros(0)
+        self.vecPreviousCorrection = np.zeros(0)
+        # Every node starts again with the full step on the next iteration. Needed after any change to the
+        # track, its width or the displacements, as the steps of settled nodes have shrunk to nothing and
+        # would leave them frozen where the old line had them
+
+    def UpdateRacingLine(self):
+        self.vecRacingLine = self.vecCentre + self.vecNormal * self.vecDisplacement[:, None]
+        # Racing line nodes sit on the centre line, pushed out along the normal by their displacement
+
+    def Step(self):
+        vectorLeft = np.roll(self.vecRacingLine, 1, axis=0) - self.vecRacingLine
+        vectorRight = np.roll(self.vecRacingLine, -1, axis=0) - self.vecRacingLine
+        # Vectors from every node to its neighbours
+
+        vectorSum = (vectorLeft / np.hypot(vectorLeft[:, 0], vectorLeft[:, 1])[:, None] +
+                     vectorRight / np.hypot(vectorRight[:, 0], vectorRight[:, 1])[:, None])
+        glen = np.hypot(vectorSum[:, 0], vectorSum[:, 1])
+        vectorSum = np.divide(vectorSum, glen[:, None], out=np.zeros_like(vectorSum), where=glen[:, None] > 0.0)
+        # Add the normalised neighbour vectors together to create the bisector, which is zero on a straight
+
+        dp = np.einsum('ij,ij->i', self.vecNormal, vectorSum)
+        # Project required correction onto the normal to give displacement
+
+        if self.bAdaptiveStep:
+            if len(self.vecStep) != len(dp):
+                self.vecStep = np.full(len(dp), self.fStepSize)
+                self.vecPreviousCorrection = np.zeros(len(dp))
+            self.vecStep = np.where(dp * self.vecPreviousCorrection < 0.0, 0.5 * self.vecStep,
+                                    np.minimum(1.2 * self.vecStep, self.fStepSize))
+            self.vecPreviousCorrection = dp
+            fStep = self.vecStep
+            # A node whose correction flipped has stepped over its settling point, so it steps half as far
+        else:
+            fStep = self.fStepSize
+
+        fPreviousDisplacement = self.vecDisplacement
+        self.vecDisplacement = np.clip(fPreviousDisplacement + dp * fStep, -self.fTrackWidth, self.fTrackWidth)
+        self.UpdateRacingLine()
+        # Shortest path, with displaced points clamped to track width
+
+        return float(np.max(np.abs(self.vecDisplacement - fPreviousDisplacement), initial=0.0))
+        # Largest change of any displacement in this iteration
+
+    def Solve(self, nIterations):
+        self.nIterationsRun = 0
+        if self.bConverged:
+            return 0
+            # Nothing has changed since the racing line settled
+
+        if self.bMinimumCurvature:
+            return self.SolveMinimumCurvature()
+
+        for n in range(nIterations):
+            self.fResidual = self.Step()
+            self.nIterationsRun += 1
+            if self.fResidual < self.fTolerance:
+                self.bConverged = True
+                break
+
+        return self.nIterationsRun
+
+    def GetMinimumCurvatureProblem(self):
+        wc = self.fCurvatureBlend
+        ws = 1.0 - self.fCurvatureBlend
+        # Minimise wc * 0.5 * sum(|P[i - 1] - 2 P[i] + P[i + 1]|^2) + ws * 0.5 * sum(|P[i + 1] - P[i]|^2)
+        # over the displacements a, with P[i] = C[i] + a[i] * N[i]. This is the quadratic 0.5 a'Ha + c'a
+
+        nn1 = np.einsum('ij,ij->i', self.vecNormal, np.roll(self.vecNormal, -1, axis=0))
+        nn2 = np.einsum('ij,ij->i', self.vecNormal, np.roll(self.vecNormal, -2, axis=0))
+        # Dot products of every normal with the normals one and two nodes ahead
+
+        d0 = np.full(len(self.vecCentre), 6.0 * wc + 2.0 * ws)
+        d0 += 1e-9 * d0[0]
+        d1 = (-4.0 * wc - 1.0 * ws) * nn1
+        d2 = wc * nn2
+        # H is cyclic pentadiagonal, the tiny extra diagonal keeps it positive definite
+
+        K0 = np.roll(self.vecCentre, 1, axis=0) - 2.0 * self.vecCentre + np.roll(self.vecCentre, -1, axis=0)
+        E0 = np.roll(self.vecCentre, -1, axis=0) - self.vecCentre
+        DK0 = np.roll(K0, 1, axis=0) - 2.0 * K0 + np.roll(K0, -1, axis=0)
+        c = np.einsum('ij,ij->i', self.vecNormal, wc * DK0 + ws * (np.roll(E0, 1, axis=0) - E0))
+        # Curvature and edge vectors of the centre line give the linear term
+
+        return d0, d1, d2, c
+
+    def SolveMinimumCurvature(self):
+        d0, d1, d2, c = self.GetMinimumCurvatureProblem()
+        fLower, fUpper = -self.fTrackWidth, self.fTrackWidth
+
+        def Objective(x):
+            return 0.5 * x @ CyclicBandedMatVec(d0, d1, d2, x) + c @ x
+
+        x = np.clip(self.vecDisplacement, fLower, fUpper)
+        # Projected Newton method, warm started from the current displacements: take a Newton step on the
+        # nodes that are free to move, project it back inside the track, and backtrack until the line improves
+
+        self.nIterationsRun = 0
+        for n in range(self.nMaxNewtonIterations):
+            g = CyclicBandedMatVec(d0, d1, d2, x) + c
+            fStep = x - np.clip(x - g / d0, fLower, fUpper)
+            self.fResidual = float(np.max(np.abs(fStep), initial=0.0))
+            if self.fResidual < self.fTolerance:
+                break
+            # Projected gradient step in displacement units, zero once the line is optimal
+
+            fEpsilon = min(1e-3 * (fUpper - fLower), float(np.linalg.norm(fStep)))
+            binding = ((x <= fLower + fEpsilon) & (g > 0.0)) | ((x >= fUpper - fEpsilon) & (g < 0.0))
+            free = ~binding
+            # Nodes on or next to a track edge that the gradient pushes outwards stay where they are
+
+            d = SolveCyclicBanded(np.where(free, d0, 1.0), d1 * (free & np.roll(free, -1)),
+                                  d2 * (free & np.roll(free, -2)), np.where(free, -g, 0.0))
+            d = np.where(binding, -g / d0, d)
+            # Replacing the rows and columns of binding nodes with the identity keeps the Newton system banded
+
+            fAlpha = 1.0
+            fObjective = Objective(x)
+            while True:
+                xNew = np.clip(x + fAlpha * d, fLower, fUpper)
+                if Objective(xNew) <= fObjective + 1e-4 * (g @ (xNew - x)) or fAlpha < 1e-12:
+                    break
+                fAlpha *= 0.5
+            # Armijo backtracking along the projected path
+
+            x = xNew
+            self.nIterationsRun += 1
+
+        self.vecDisplacement = x
+        self.UpdateRacingLine()
+        self.bConverged = self.fResidual < self.fTolerance
+        # Out of Newton steps short of the tolerance is not converged, so the next 'Solve' carries on
+
+        return self.nIterationsRun
@@ -0,0 +1,173 @@
+import collections
+import threading
+import time
+import numpy as np
+import LapTimeEvaluator as LTE
+import RacingLineSolver as RLS
+import Spline as SP
+
+# Runs a RacingLineSolver on a background thread. The render loop hands it track edits and settings,
+# and always draws the latest finished snapshot of the racing line, however long the solve takes.
+
+RacingLineSnapshot = collections.namedtuple(
+    'RacingLineSnapshot', ['nVersion', 'vecRacingLine', 'vecDisplacement', 'nIterationsRun', 'fResidual', 'bConverged',
+                           'racingLine', 'fLapTime'])
+# Immutable result published by the worker, its arrays are read-only copies. 'racingLine' is a Spline through
+# the racing line with its lengths and tables already calculated, which nothing changes once it is published
+
+class RacingLineWorker:
+    def __init__(self, solver=None):
+        self.solver = solver if solver is not None else RLS.RacingLineSolver()
+        # Solver owned by the worker, only touched from the worker thread once it is started
+        self.nIterations = 1
+        # Maximum number of iterations per published snapshot
+        self.snapshot = RacingLineSnapshot(0, np.zeros((0, 2)), np.zeros(0), 0, 0.0, False, SP.Spline(), 0.0)
+        # Latest finished racing line, replaced as a whole so readers never see half an update
+        self.listPendingEdits = []
+        # Edits to apply to the solver before its next iterations
+        self.condition = threading.Condition()
+        # Guards the pending edits and wakes the worker thread when there is work to do
+        self.thread = None
+        self.bRunning = False
+        self.fPublishInterval = 0.0
+        # Shortest time in seconds between snapshots published by the worker thread, such as one frame
+        self.fLastPublish = 0.0
+        self.fTessellationTolerance = None
+        # Tolerance the racing line of every snapshot is tessellated with, None to leave it to the reader
+        self.lapTimes = LTE.LapTimeEvaluator()
+        # Lap time of the racing line of every snapshot
+
+    def Start(self):
+        # Start solving on a background thread
+        self.bRunning = True
+        self.thread = threading.Thread(target=self.Run, name='RacingLineWorker', daemon=True)
+        self.thread.start()
+
+    def Stop(self):
+        # Ask the background thread to finish and wait for it
+        with self.condition:
+            self.bRunning = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def IsRunning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def Submit(self, fnEdit):
+        # Queue a function that edits the solver, it runs on the worker thread before the next iterations
+        with self.condition:
+            self.listPendingEdits.append(fnEdit)
+            self.condition.notify()
+
+    def SetTrack(self, vecCentre, vecGradient, nodes=None):
+        vecCentre = np.array(vecCentre, dtype=np.float64)
+        vecGradient = np.array(vecGradient, dtype=np.float64)
+        nodes = list(nodes) if nodes is not None else None
+        # Copy the arguments now, the caller is free to change its own arrays afterwards
+
+        def Edit(solver):
+            bNewTrack = len(vecCentre) != len(solver.vecDisplacement)
+            solver.SetTrack(vecCentre, vecGradient)
+            if nodes is not None and not bNewTrack:
+                solver.ResetNodes(nodes)
+            # Put the nodes around an edit back on the centre line, a new track starts there anyway
+
+        self.Submit(Edit)
+
+    def SetTrackFromSpline(self, path, nodes=None):
+        t = np.arange(len(path.vecPoints), dtype=np.float64)
+        self.SetTrack(path.GetSplinePoints(t), path.GetSplineGradients(t), nodes)
+        # Use a looped spline's control points as the centre line nodes
+
+    def SetDisplacement(self, vecDisplacement):
+        vecDisplacement = np.array(vecDisplacement, dtype=np.float64)
+        # A copy the solver can write into, such as of a read-only cached array
+
+        def Edit(solver):
+            if len(vecDisplacement) == len(solver.vecDisplacement):
+                solver.vecDisplacement = np.clip(vecDisplacement, -solver.fTrackWidth, solver.fTrackWidth)
+                solver.UpdateRacingLine()
+                solver.ResetSteps()
+                solver.bConverged = False
+            # Start the solve from a known racing line of the same track. It is still solved, so a line
+            # that has already converged is confirmed in a single iteration
+
+        self.Submit(Edit)
+
+    def SetOptions(self, **options):
+        # Change solver settings such as fTrackWidth, bMinimumCurvature or fCurvatureBlend
+        def Edit(solver):
+            for sName, value in options.items():
+                setattr(solver, sName, value)
+            solver.ResetSteps()
+            solver.bConverged = False
+
+        self.Submit(Edit)
+
+    def SetIterations(self, nIterations):
+        with self.condition:
+            self.nIterations = nIterations
+            self.condition.notify()
+
+    def Step(self):
+        # Apply the pending edits, run one batch of iterations and publish the result.
+        # Called by the worker thread, or directly by the render loop when no thread is running
+        with self.condition:
+            listEdits, self.listPendingEdits = self.listPendingEdits, []
+            nIterations = self.nIterations
+
+        for fnEdit in listEdits:
+            fnEdit(self.solver)
+
+        if not listEdits and (self.solver.bConverged or nIterations <= 0):
+            return False
+            # Nothing changed and there is nothing left to solve
+
+        self.solver.Solve(nIterations)
+        self.Publish()
+        return True
+
+    def Publish(self):
+        vecRacingLine = self.solver.vecRacingLine.copy()
+        vecDisplacement = self.solver.vecDisplacement.copy()
+        vecRacingLine.flags.writeable = False
+        vecDisplacement.flags.writeable = False
+
+        racingLine = SP.Spline()
+        racingLine.SetPoints(vecRacingLine, bCopy=False)
+        racingLine.UpdateSplineProperties()
+        racingLine.GetArcLengthTable()
+        if self.fTessellationTolerance is not None:
+            racingLine.GetTessellation(self.fTessellationTolerance)
+        fLapTime = float(self.lapTimes.EvaluateSpline(racingLine).fLapTime[0])
+        # Everything the render thread needs from the racing line is calculated here, so taking a new
+        # snapshot costs it nothing more than swapping references
+
+        self.snapshot = RacingLineSnapshot(self.snapshot.nVersion + 1, vecRacingLine, vecDisplacement,
+                                           self.solver.nIterationsRun, self.solver.fResidual, self.solver.bConverged,
+                                           racingLine, fLapTime)
+        self.fLastPublish = time.perf_counter()
+        # A single reference assignment, so the render thread sees either the old or the new snapshot
+
+    def Run(self):
+        while True:
+            with self.condition:
+                while self.bRunning and not self.listPendingEdits and (self.solver.bConverged or self.nIterations <= 0):
+                    self.condition.wait()
+                    # Sleep until there is an edit, or more iterations are allowed
+                if not self.bRunning:
+                    return
+
+            self.Step()
+            time.sleep(0)
+            # Hand the interpreter lock straight back to the render thread between batches
+
+            with self.condition:
+                fWait = self.fLastPublish + self.fPublishInterval - time.perf_counter()
+                while self.bRunning and fWait > 0.0:
+                    self.condition.wait(fWait)
+                    fWait = self.fLastPublish + self.fPublishInterval - time.perf_counter()
+                # Publish no more often than the render loop can show the snapshots, edits made meanwhile
+                # are all applied together by the next batch
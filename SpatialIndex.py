@@ -0,0 +1,265 @@
+import numpy as np
+
+# Uniform grid spatial indexes for nearest control point picking and for projecting positions onto
+# a spline. All queries take an (M,2) array of positions and are answered in one vectorized pass.
+
+KEY_OFFSET = 1 << 30
+KEY_STRIDE = 1 << 31
+# Packs a cell's (x, y) coordinates into one sortable int64 key
+
+class PointGrid:
+    def __init__(self, fCellSize=None):
+        self.fCellSize = fCellSize
+        # Width of a grid cell, chosen from the point spacing by 'Build' when None
+        self.vecPoints = np.zeros((0, 2))
+        # Positions of the indexed points
+        self.vecCells = np.zeros((0, 2), dtype=np.int64)
+        # Grid cell of every point
+        self.vecKeys = np.zeros(0, dtype=np.int64)
+        # Packed cell key of every point
+        self.vecOrder = np.zeros(0, dtype=np.int64)
+        # Point indices sorted by cell key, so the points of a cell are one contiguous run
+        self.bSorted = True
+        # False when points moved cells since 'vecOrder' was last sorted
+
+    def Build(self, vecPoints):
+        self.vecPoints = np.array(vecPoints, dtype=np.float64).reshape(-1, 2)
+        if self.fCellSize is None:
+            vecSize = np.ptp(self.vecPoints, axis=0) if len(self.vecPoints) else np.ones(2)
+            self.fCellSize = max(float(np.sqrt(vecSize[0] * vecSize[1] / max(len(self.vecPoints), 1))),
+                                 float(vecSize.max()) / max(len(self.vecPoints), 1), 1e-9)
+            # About one point per cell on average
+
+        self.vecCells = np.floor(self.vecPoints / self.fCellSize).astype(np.int64)
+        self.vecKeys = self.GetKeys(self.vecCells)
+        self.vecOrder = np.argsort(self.vecKeys, kind='stable')
+        self.bSorted = True
+
+    def GetKeys(self, vecCells):
+        return (vecCells[..., 0] + KEY_OFFSET) * KEY_STRIDE + (vecCells[..., 1] + KEY_OFFSET)
+
+    def Update(self, nodes, vecPoints):
+        # Move some of the indexed points. Only their cells change here, the sorted order is
+        # repaired lazily by the next query
+        nodes = np.atleast_1d(np.asarray(nodes, dtype=np.int64))
+        self.vecPoints[nodes] = np.asarray(vecPoints, dtype=np.float64).reshape(-1, 2)
+        self.vecCells[nodes] = np.floor(self.vecPoints[nodes] / self.fCellSize).astype(np.int64)
+        vecKeys = self.GetKeys(self.vecCells[nodes])
+        if np.any(vecKeys != self.vecKeys[nodes]):
+            self.vecKeys[nodes] = vecKeys
+            self.bSorted = False
+
+    def EnsureSorted(self):
+        if not self.bSorted:
+            self.vecOrder = self.vecOrder[np.argsort(self.vecKeys[self.vecOrder], kind='stable')]
+            self.bSorted = True
+            # The previous order is almost sorted already, which the stable sort takes advantage of
+
+    def GetRingCandidates(self, vecQueryCells, pending, nRing):
+        # Every indexed point in the ring of cells nRing cells away from each pending query's own cell,
+        # as (query, point) index pairs
+        r = np.arange(-nRing, nRing) if nRing > 0 else np.zeros(1, dtype=np.int64)
+        n = np.full(len(r), nRing)
+        vecOffsets = np.column_stack((np.concatenate((r, n, -r, -n)), np.concatenate((-n, r, n, -r))))[:max(8 * nRing, 1)]
+        # The four sides of the ring, each ending just short of the next corner. Ring zero is the query's own cell
+
+        keys = self.GetKeys((vecQueryCells[pending][:, None, :] + vecOffsets[None, :, :]).reshape(-1, 2))
+        vecSortedKeys = self.vecKeys[self.vecOrder]
+        start = np.searchsorted(vecSortedKeys, keys, side='left')
+        counts = np.searchsorted(vecSortedKeys, keys, side='right') - start
+        # Range of sorted points inside each visited cell
+
+        owner = np.repeat(np.repeat(pending, len(vecOffsets)), counts)
+        candidate = self.vecOrder[np.arange(counts.sum()) + np.repeat(start - (np.cumsum(counts) - counts), counts)]
+        return owner, candidate
+
+    def GetRingsCandidates(self, vecQueryCells, pending, nRing):
+        # Every indexed point in the ring nRing[i] cells away from pending query i, visiting each distinct
+        # ring once for all the queries on it
+        for nRingValue in np.unique(nRing).tolist():
+            yield self.GetRingCandidates(vecQueryCells, pending[nRing == nRingValue], nRingValue)
+
+    def GetAllCandidates(self, queries):
+        # Every indexed point paired with every one of the given queries, in batches of (query, point)
+        # index pairs of about a million. Used for the queries whose rings would cover more cells than
+        # there are points, such as queries far outside the grid
+        nBatch = max(1, (1 << 20) // len(self.vecPoints))
+        for k in range(0, len(queries), nBatch):
+            yield (np.repeat(queries[k:k + nBatch], len(self.vecPoints)),
+                   np.tile(np.arange(len(self.vecPoints)), len(queries[k:k + nBatch])))
+
+    def GetRingLimits(self, vecQueryCells):
+        # Rings nearest to and furthest from every query that can hold occupied cells. Rings closer
+        # than the first are empty, so a query outside the occupied cells starts at the first
+        vecCellMin = self.vecCells.min(axis=0)
+        vecCellMax = self.vecCells.max(axis=0)
+        nFirst = np.max(np.maximum(np.maximum(vecCellMin - vecQueryCells, vecQueryCells - vecCellMax), 0), axis=1)
+        nLast = np.max(np.maximum(np.abs(vecQueryCells - vecCellMin), np.abs(vecQueryCells - vecCellMax)), axis=1)
+        return nFirst, nLast
+
+    def Nearest(self, vecQuery):
+        # Index of and distance to the nearest indexed point, for every query position
+        vecQuery = np.asarray(vecQuery, dtype=np.float64).reshape(-1, 2)
+        nearest = np.full(len(vecQuery), -1, dtype=np.int64)
+        fBestSq = np.full(len(vecQuery), np.inf)
+        if len(self.vecPoints) == 0:
+            return nearest, fBestSq
+
+        def Keep(owner, candidate):
+            fDistSq = np.sum((self.vecPoints[candidate] - vecQuery[owner]) ** 2, axis=1)
+            np.minimum.at(fBestSq, owner, fDistSq)
+            bBest = fDistSq == fBestSq[owner]
+            nearest[owner[bBest]] = candidate[bBest]
+            # Keep the closest candidate of every query
+
+        self.EnsureSorted()
+        vecQueryCells = np.floor(vecQuery / self.fCellSize).astype(np.int64)
+        nRing, nRingLimit = self.GetRingLimits(vecQueryCells)
+        nCellsVisited = np.zeros(len(vecQuery), dtype=np.int64)
+
+        pending = np.arange(len(vecQuery))
+        while len(pending):
+            nCellsVisited[pending] += np.maximum(8 * nRing[pending], 1)
+            bAll = nCellsVisited[pending] > len(self.vecPoints)
+            for owner, candidate in self.GetAllCandidates(pending[bAll]):
+                Keep(owner, candidate)
+            pending = pending[~bAll]
+            # Once a query has cost as many cells as there are points, checking every point is cheaper
+
+            for owner, candidate in self.GetRingsCandidates(vecQueryCells, pending, nRing[pending]):
+                Keep(owner, candidate)
+            fReach = nRing[pending] * self.fCellSize
+            pending = pending[(fBestSq[pending] > fReach * fReach) & (nRing[pending] < nRingLimit[pending])]
+            nRing[pending] += 1
+            # Any point in a further ring is at least nRing cells away, so a closer hit is final
+
+        return nearest, np.sqrt(fBestSq)
+
+    def WithinRadius(self, vecQuery, fRadius):
+        # Every indexed point within fRadius of each query position, as (query, point) index pairs.
+        # fRadius is one radius for all queries, or one per query
+        vecQuery = np.asarray(vecQuery, dtype=np.float64).reshape(-1, 2)
+        fRadius = np.broadcast_to(np.asarray(fRadius, dtype=np.float64), (len(vecQuery),))
+        if len(self.vecPoints) == 0 or len(vecQuery) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        self.EnsureSorted()
+        vecQueryCells = np.floor(vecQuery / self.fCellSize).astype(np.int64)
+        nFirst, nLast = self.GetRingLimits(vecQueryCells)
+        nLast = np.minimum(np.ceil(np.minimum(fRadius / self.fCellSize, 2.0 ** 40)).astype(np.int64), nLast)
+        nCells = (2.0 * nLast + 1.0) ** 2 - np.maximum(2.0 * nFirst - 1.0, 0.0) ** 2
+        bAll = (nCells > len(self.vecPoints)) & (nLast >= nFirst)
+        # Cells in the rings each query needs, checking every point is cheaper for the queries needing more
+
+        listOwners = []
+        listCandidates = []
+        def Keep(owner, candidate):
+            bInside = np.sum((self.vecPoints[candidate] - vecQuery[owner]) ** 2, axis=1) <= fRadius[owner] ** 2
+            listOwners.append(owner[bInside])
+            listCandidates.append(candidate[bInside])
+
+        for owner, candidate in self.GetAllCandidates(np.flatnonzero(bAll)):
+            Keep(owner, candidate)
+        pending = np.flatnonzero(~bAll & (nLast >= nFirst))
+        nRing = nFirst.copy()
+        while len(pending):
+            for owner, candidate in self.GetRingsCandidates(vecQueryCells, pending, nRing[pending]):
+                Keep(owner, candidate)
+            pending = pending[nRing[pending] < nLast[pending]]
+            nRing[pending] += 1
+
+        return (np.concatenate(listOwners) if listOwners else np.zeros(0, dtype=np.int64),
+                np.concatenate(listCandidates) if listCandidates else np.zeros(0, dtype=np.int64))
+
+    def NearestPoint(self, x, y):
+        nearest, fDistance = self.Nearest([[x, y]])
+        return int(nearest[0]), float(fDistance[0])
+
+class SplineIndex:
+    def __init__(self, spline, nSamplesPerSegment=8):
+        self.spline = spline
+        # Spline being indexed, its control points are read again by 'Build' and 'UpdateNodes'
+        self.nSamplesPerSegment = nSamplesPerSegment
+        # Polyline vertices sampled along every segment
+        self.vecT = np.zeros(0)
+        # Spline parameter of every polyline vertex
+        self.grid = PointGrid()
+        # Grid over the polyline vertices
+
+    def Build(self):
+        nSegments = self.spline.GetSegmentCount()
+        nVertices = nSegments * self.nSamplesPerSegment + (0 if self.spline.bIsLooped else 1)
+        self.vecT = np.arange(nVertices) / self.nSamplesPerSegment
+        vecVertices = self.spline.GetSplinePoints(self.vecT)
+
+        fSpacing = np.mean(np.hypot(*np.diff(vecVertices, axis=0).T)) if nVertices > 1 else 1.0
+        self.grid = PointGrid(max(2.0 * fSpacing, 1e-9))
+        self.grid.Build(vecVertices)
+
+    def UpdateNodes(self, nodes):
+        # Resample the polyline around control points that moved, then move those vertices in the grid
+        segments = self.spline.GetAffectedSegments(np.atleast_1d(nodes))
+        vertices = (segments[:, None] * self.nSamplesPerSegment + np.arange(self.nSamplesPerSegment + 1)).ravel()
+        vertices = np.unique(vertices % len(self.vecT) if self.spline.bIsLooped else vertices[vertices < len(self.vecT)])
+        self.grid.Update(vertices, self.spline.GetSplinePoints(self.vecT[vertices]))
+
+    def Project(self, vecQuery, nNewtonSteps=6):
+        # Closest point on the spline to every query position: returns its parameter 't', the distance
+        # to it and the point itself. Queries are cheapest close to the spline, far from it every
+        # polyline vertex about as far away as the nearest one has to be checked
+        vecQuery = np.asarray(vecQuery, dtype=np.float64).reshape(-1, 2)
+        nVertices = len(self.vecT)
+        nEdges = nVertices if self.spline.bIsLooped else nVertices - 1
+        fTMax = float(self.spline.GetSegmentCount())
+        vecVertices = self.grid.vecPoints
+        vecEdges = np.roll(vecVertices, -1, axis=0) - vecVertices
+        fEdgeLengthSq = np.sum(vecEdges * vecEdges, axis=1)
+
+        vertex, fNearest = self.grid.Nearest(vecQuery)
+        owner, edge = self.grid.WithinRadius(vecQuery, fNearest + np.sqrt(fEdgeLengthSq[:nEdges].max()))
+        # Both ends of the polyline edge holding the closest point are within the nearest vertex
+        # distance plus one edge length, so every edge starting at one of these vertices is a candidate
+        bEdge = edge < nEdges
+        owner = owner[bEdge]
+        edge = edge[bEdge]
+
+        d = vecQuery[owner] - vecVertices[edge]
+        u = np.clip(np.divide(np.sum(d * vecEdges[edge], axis=1), fEdgeLengthSq[edge],
+                              out=np.zeros(len(edge)), where=fEdgeLengthSq[edge] > 0.0), 0.0, 1.0)
+        fDistSq = np.sum((d - u[:, None] * vecEdges[edge]) ** 2, axis=1)
+
+        fBestSq = np.full(len(vecQuery), np.inf)
+        np.minimum.at(fBestSq, owner, fDistSq)
+        t = self.vecT[vertex].copy()
+        bBest = fDistSq == fBestSq[owner]
+        t[owner[bBest]] = (edge[bBest] + u[bBest]) / self.nSamplesPerSegment
+        # Parameter of the closest point on the polyline, vertices are evenly spaced in t
+
+        t = np.mod(t, fTMax) if self.spline.bIsLooped else np.clip(t, 0.0, fTMax)
+        vecClosest = self.spline.GetSplinePoints(t)
+        fDistSq = np.sum((vecClosest - vecQuery) ** 2, axis=1)
+        fMaxStep = 1.0 / self.nSamplesPerSegment
+        fScale = np.ones(len(vecQuery))
+        for n in range(nNewtonSteps):
+            # Newton steps on the squared distance refine the polyline estimate onto the curve, falling
+            # back to Gauss-Newton where the curve bends away too sharply for the full Hessian to be
+            # positive. A step never moves further than one polyline edge and is kept only if it moves
+            # closer, otherwise that query tries half the step next time
+            g = self.spline.GetSplineGradients(t)
+            h = self.spline.GetSplineSecondDerivatives(t)
+            fGradSq = np.sum(g * g, axis=1)
+            fHessian = fGradSq - np.sum((vecQuery - vecClosest) * h, axis=1)
+            fHessian = np.where(fHessian > 0.0, fHessian, fGradSq)
+            dt = np.divide(np.sum((vecQuery - vecClosest) * g, axis=1), fHessian, out=np.zeros_like(fHessian), where=fHessian > 0.0)
+            tNew = t + fScale * np.clip(dt, -fMaxStep, fMaxStep)
+            tNew = np.mod(tNew, fTMax) if self.spline.bIsLooped else np.clip(tNew, 0.0, fTMax)
+
+            vecNew = self.spline.GetSplinePoints(tNew)
+            fNewSq = np.sum((vecNew - vecQuery) ** 2, axis=1)
+            bCloser = fNewSq < fDistSq
+            t = np.where(bCloser, tNew, t)
+            vecClosest = np.where(bCloser[:, None], vecNew, vecClosest)
+            fDistSq = np.where(bCloser, fNewSq, fDistSq)
+            fScale = np.where(bCloser, fScale, 0.5 * fScale)
+
+        return t, np.sqrt(fDistSq), vecClosest
@@ -1,16 +1,81 @@
+import bisect
 import math
 import numpy as np
-import pygame
-from pygame.locals import *
+
+GAUSS_LEGENDRE_NODES, GAUSS_LEGENDRE_WEIGHTS = np.polynomial.legendre.leggauss(5)
+# Nodes and weights of 5-point Gauss-Legendre quadrature on [-1, 1], used to integrate arc length
+GAUSS_LEGENDRE_RULE = list(zip(GAUSS_LEGENDRE_NODES.tolist(), GAUSS_LEGENDRE_WEIGHTS.tolist()))
+# The same rule as (node, weight) pairs of Python floats, for the scalar functions
+CATMULL_ROM_BASIS = 0.5 * np.array([[0.0, 2.0, 0.0, 0.0], [-1.0, 0.0, 1.0, 0.0],
+                                     [2.0, -5.0, 4.0, -1.0], [-1.0, 3.0, -3.0, 1.0]])
+# Rows give the 1, u, u^2 and u^3 coefficients of a segment from its four control points, the polynomials
+# 'GetSplinePoints' evaluates through its interpolation factors
 
 class Spline:
+    __slots__ = ('vecPoints', 'fTotalSplineLength', 'vecSegmentLength', 'vecCumulativeLength',
+                 'bIsLooped', 'setDirtyNodes', 'fTessellationTolerance', 'vecTessellationT',
+                 'vecTessellation', 'vecTessellationCounts', 'setTessellationDirty', 'vecArcLengthTable')
+    # Fixed attributes, so a spline carries no per-instance dictionary
+
     def __init__(self):
-        self.points = []
-        # List to store the control points of the spline curve
+        self.vecPoints = np.zeros((0, 2))
+        # (N,2) array of the control points of the spline curve
         self.fTotalSplineLength = 0.0
         # Total length of the spline curve
+        self.vecSegmentLength = np.zeros(0)
+        # Length of every segment of the spline
+        self.vecCumulativeLength = np.zeros(1)
+        # Distance along the spline at the start of every segment, followed by the total length
         self.bIsLooped = True
         # Flag indicating whether the spline is looped (cyclic)
+        self.setDirtyNodes = set()
+        # Control points moved since the segment lengths were last calculated
+        self.fTessellationTolerance = None
+        # Flatness tolerance the cached tessellation was made with, None when there is none
+        self.vecTessellationT = np.zeros(0)
+        # Parameter 't' of every vertex of the cached tessellation, in order along the spline
+        self.vecTessellation = np.zeros((0, 2))
+        # (M,2) vertices of the cached tessellation
+        self.vecTessellationCounts = np.zeros(0, dtype=np.int64)
+        # Number of tessellation vertices starting in every segment
+        self.setTessellationDirty = set()
+        # Control points moved since the tessellation was last made
+        self.vecArcLengthTable = None
+        # Cached (t, distance) samples along the spline for fast distance lookups, None when out of date
+
+    @property
+    def points(self):
+        return tuple((x, y, l) for (x, y), l in zip(self.vecPoints.tolist(), self.GetNodeSegmentLengths().tolist()))
+        # Old view of the control points, (x, y, segment length) per control point. It is a read-only copy,
+        # so old code writing into it fails instead of changing nothing: move control points with
+        # 'SetControlPoint', or replace them all by assigning to 'points'
+
+    @points.setter
+    def points(self, points):
+        self.SetPoints([p[:2] for p in points])
+        # Accept the old list-of-lists, ignoring any cached segment length in the third element
+
+    def SetPoints(self, vecPoints, bCopy=True):
+        vecPoints = np.asarray(vecPoints, dtype=np.float64).reshape(-1, 2)
+        self.vecPoints = vecPoints.copy() if bCopy else vecPoints
+        # Replace all the control points. With bCopy False the spline keeps a view of the given array,
+        # so a spline derived from another one's arrays costs no copy
+
+        self.setDirtyNodes.clear()
+        self.vecSegmentLength = np.zeros(0)
+        # Every segment length is recalculated by the next 'UpdateSplineProperties'
+
+        self.setTessellationDirty.clear()
+        self.fTessellationTolerance = None
+        self.vecArcLengthTable = None
+        # And the next 'GetTessellation' and 'GetArcLengthTable' start again from scratch
+
+    def GetNodeSegmentLengths(self):
+        fLength = np.zeros(len(self.vecPoints))
+        n = min(len(self.vecSegmentLength), len(fLength))
+        fLength[:n] = self.vecSegmentLength[:n]
+        return fLength
+        # Length of the segment starting at every control point, zero where none starts
 
     def GetSplinePoint(self, t):
         p0, p1, p2, p3 = 0, 0, 0, 0
@@ -25,10 +90,10 @@ class Spline:
             # Set the indices of control points based on the current value of 't'
         else:
             # If the spline is looped
-            p1 = int(t) % len(self.points)
-            p2 = (p1 + 1) % len(self.points)
-            p3 = (p2 + 1) % len(self.points)
-            p0 = p1 - 1 if p1 >= 1 else len(self.points) - 1
+            p1 = int(t) % len(self.vecPoints)
+            p2 = (p1 + 1) % len(self.vecPoints)
+            p3 = (p2 + 1) % len(self.vecPoints)
+            p0 = p1 - 1 if p1 >= 1 else len(self.vecPoints) - 1
             # Set the indices of control points based on the current value of 't' and handle edge cases
 
         t = t - int(t)
@@ -44,8 +109,9 @@ class Spline:
         q4 = ttt - tt
         # Calculate interpolation factors for cubic Hermite spline interpolation
 
-        tx = 0.5 * (self.points[p0][0] * q1 + self.points[p1][0] * q2 + self.points[p2][0] * q3 + self.points[p3][0] * q4)
-        ty = 0.5 * (self.points[p0][1] * q1 + self.points[p1][1] * q2 + self.points[p2][1] * q3 + self.points[p3][1] * q4)
+        points = self.vecPoints
+        tx = 0.5 * (points[p0, 0] * q1 + points[p1, 0] * q2 + points[p2, 0] * q3 + points[p3, 0] * q4)
+        ty = 0.5 * (points[p0, 1] * q1 + points[p1, 1] * q2 + points[p2, 1] * q3 + points[p3, 1] * q4)
         # Calculate the interpolated x and y coordinates based on the control points and interpolation factors
 
         return [tx, ty]
@@ -64,10 +130,10 @@ class Spline:
             # Set the indices of control points based on the current value of 't'
         else:
             # If the spline is looped
-            p1 = int(t) % len(self.points)
-            p2 = (p1 + 1) % len(self.points)
-            p3 = (p2 + 1) % len(self.points)
-            p0 = p1 - 1 if p1 >= 1 else len(self.points) - 1
+            p1 = int(t) % len(self.vecPoints)
+            p2 = (p1 + 1) % len(self.vecPoints)
+            p3 = (p2 + 1) % len(self.vecPoints)
+            p0 = p1 - 1 if p1 >= 1 else len(self.vecPoints) - 1
             # Set the indices of control points based on the current value of 't' and handle edge cases
 
         t = t - int(t)
@@ -83,85 +149,412 @@ class Spline:
         q4 = 3.0 * tt - 2.0 * t
         # Calculate interpolation factors for the derivative of the cubic Hermite spline
 
-        tx = 0.5 * (self.points[p0][0] * q1 + self.points[p1][0] * q2 + self.points[p2][0] * q3 + self.points[p3][0] * q4)
-        ty = 0.5 * (self.points[p0][1] * q1 + self.points[p1][1] * q2 + self.points[p2][1] * q3 + self.points[p3][1] * q4)
+        points = self.vecPoints
+        tx = 0.5 * (points[p0, 0] * q1 + points[p1, 0] * q2 + points[p2, 0] * q3 + points[p3, 0] * q4)
+        ty = 0.5 * (points[p0, 1] * q1 + points[p1, 1] * q2 + points[p2, 1] * q3 + points[p3, 1] * q4)
         # Calculate the interpolated x and y components of the gradient vector
 
         return [tx, ty]
         # Return the calculated gradient vector
 
-    def CalculateSegmentLength(self, node):
+    def CalculateSegmentLength(self, node, nSubSteps=4):
+        ax, bx, cx, ay, by, cy = self.GetSegmentGradientPolynomial(node)
         fLength = 0.0
-        fStepSize = 0.1
-        # Initialize the length of the segment to 0 and set the step size for calculating the length
+        for n in range(nSubSteps):
+            for x, w in GAUSS_LEGENDRE_RULE:
+                u = (n + 0.5 * (x + 1.0)) / nSubSteps
+                fLength += w * math.hypot(ax + u * (bx + u * cx), ay + u * (by + u * cy))
+        return 0.5 * fLength / nSubSteps
+        # Integrate the speed |dP/dt| over the segment starting at the given node to get its arc length,
+        # with one Gauss-Legendre rule on each of nSubSteps even steps. Plain floats, so a single segment
+        # costs no array overhead
 
-        old_point = self.GetSplinePoint(float(node))
-        # Get the initial point on the spline corresponding to the given node parameter
+    def GetSegmentGradientPolynomial(self, node):
+        n = len(self.vecPoints)
+        if self.bIsLooped:
+            indices = [(node - 1) % n, node % n, (node + 1) % n, (node + 2) % n]
+        else:
+            node = min(node, n - 4)
+            indices = [node, node + 1, node + 2, node + 3]
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = self.vecPoints[indices].tolist()
+        # The four control points shaping the segment, as in 'GetSegmentIndices'
 
-        for t in np.arange(0.0, 1.0, fStepSize):
-            # Iterate over a range of values from 0.0 to 1.0 with a step size of 'fStepSize'
+        return (0.5 * (x2 - x0), 2.0 * x0 - 5.0 * x1 + 4.0 * x2 - x3, 1.5 * (-x0 + 3.0 * x1 - 3.0 * x2 + x3),
+                0.5 * (y2 - y0), 2.0 * y0 - 5.0 * y1 + 4.0 * y2 - y3, 1.5 * (-y0 + 3.0 * y1 - 3.0 * y2 + y3))
+        # Gradient of the segment as the x and y coefficients of 1, u and u^2, with u the parameter inside
+        # the segment. The interpolation factors of 'GetSplineGradient' gathered by power of u
 
-            new_point = self.GetSplinePoint(float(node) + t)
-            # Calculate a new point on the spline curve by adding the current value of 't' to the given node parameter
-            # Call the 'GetSplinePoint' method to retrieve the new point
+    def IntegrateSplineSpeed(self, a, b, fTolerance=1e-6, nMaxDepth=16):
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+        shape = a.shape
+        a, b = a.ravel(), b.ravel()
+        fLength = np.zeros(a.size)
+        # Arc length between every pair of parameters a[k] and b[k], computed with adaptive Gauss-Legendre quadrature
 
-            fLength += math.sqrt((new_point[0] - old_point[0]) ** 2 + (new_point[1] - old_point[1]) ** 2)
-            # Calculate the Euclidean distance between the 'new_point' and 'old_point' using the Pythagorean theorem
-            # Add the distance to the 'fLength' variable
-            # This step calculates the length of the current segment of the spline curve
+        owner = np.arange(a.size)
+        fTol = np.full(a.size, fTolerance)
+        whole = self.GaussLegendre(a, b)
+        # 'owner' maps every interval still being refined back to the length it contributes to
 
-            old_point = new_point
-            # Update the value of 'old_point' with the value of 'new_point' for the next iteration of the loop
+        for nDepth in range(nMaxDepth):
+            m = 0.5 * (a + b)
+            left = self.GaussLegendre(a, m)
+            right = self.GaussLegendre(m, b)
+            halves = left + right
+            # Split every interval in two and compare against the estimate for the whole interval
 
-        return fLength
-        # After iterating through all the sample points along the spline curve, return the calculated length of the segment
+            done = np.abs(halves - whole) <= fTol
+            if nDepth == nMaxDepth - 1:
+                done[:] = True
+            np.add.at(fLength, owner[done], halves[done])
+            # Intervals whose two estimates agree are accepted, the rest are subdivided further
+
+            refine = ~done
+            if not refine.any():
+                break
+
+            owner = np.concatenate((owner[refine], owner[refine]))
+            fTol = np.concatenate((fTol[refine], fTol[refine])) * 0.5
+            whole = np.concatenate((left[refine], right[refine]))
+            a, b = np.concatenate((a[refine], m[refine])), np.concatenate((m[refine], b[refine]))
+
+        return fLength.reshape(shape)
+
+    def GaussLegendre(self, a, b):
+        mid = 0.5 * (a + b)
+        half = 0.5 * (b - a)
+        t = mid[:, None] + half[:, None] * GAUSS_LEGENDRE_NODES
+        # Map the fixed Gauss-Legendre nodes onto every interval [a, b]
+
+        g = self.GetSplineGradients(t.ravel())
+        fSpeed = np.hypot(g[:, 0], g[:, 1]).reshape(t.shape)
+        return half * (fSpeed @ GAUSS_LEGENDRE_WEIGHTS)
+        # Weighted sum of the speed at the nodes gives the arc length of each interval
+
+    def GetNormalisedOffset(self, p, nNewtonSteps=2):
+        # Scalar version of 'GetNormalisedOffsets' for a single distance, the same steps on plain floats
+        t, fDistance = self.GetArcLengthTable()
+        fLength = float(fDistance[-1])
+        p = p % fLength if self.bIsLooped else min(max(p, 0.0), fLength)
+        k = min(max(bisect.bisect_right(fDistance, p) - 1, 0), len(t) - 2)
+        fStart = float(t[k])
+        fStep = float(fDistance[k + 1] - fDistance[k])
+        fRemaining = p - float(fDistance[k])
+        u = fStart + (fRemaining / fStep * float(t[k + 1] - t[k]) if fStep > 0.0 else 0.0)
+
+        i = int(fStart)
+        ax, bx, cx, ay, by, cy = self.GetSegmentGradientPolynomial(i)
+        uStart = fStart - i
+        uEnd = float(t[k + 1]) - i
+        u -= i
+        for n in range(nNewtonSteps):
+            fHalf = 0.5 * (u - uStart)
+            fMid = 0.5 * (u + uStart)
+            fError = -fRemaining
+            for x, w in GAUSS_LEGENDRE_RULE:
+                v = fMid + fHalf * x
+                fError += fHalf * w * math.hypot(ax + v * (bx + v * cx), ay + v * (by + v * cy))
+            fSpeed = math.hypot(ax + u * (bx + u * cx), ay + u * (by + u * cy))
+            if fSpeed > 0.0:
+                u = min(max(u - fError / fSpeed, uStart), uEnd)
+
+        return i + u
+
+    def GetNormalisedOffsets(self, p, nNewtonSteps=2):
+        # Map distances along the spline to the parameter 't' at each of them. The arc-length table gives
+        # a close guess, refined by Newton steps that each need only one Gauss-Legendre rule over the short
+        # step of the table the distance falls in
+        t, fDistance = self.GetArcLengthTable()
+        p = np.asarray(p, dtype=np.float64)
+        if self.bIsLooped:
+            p = np.mod(p, fDistance[-1])
+            # If the spline is looped, distances wrap around the lap
+        else:
+            p = np.clip(p, 0.0, fDistance[-1])
+            # If the spline is not looped, distances are clamped to the ends of the spline
 
-    def GetNormalisedOffset(self, p):
-        i = 0
-        # Initialize the index variable 'i' to 0
+        k = np.clip(np.searchsorted(fDistance, p, side='right') - 1, 0, len(t) - 2)
+        fStep = fDistance[k + 1] - fDistance[k]
+        fRemaining = p - fDistance[k]
+        u = t[k] + np.divide(fRemaining, fStep, out=np.zeros_like(p), where=fStep > 0.0) * (t[k + 1] - t[k])
+        # Bisection search of the table finds the step each distance falls in, then a linear guess inside it
 
-        while p > self.points[i][2]:
-            p -= self.points[i][2]
-            i += 1
-            # Subtract the segment length of each control point from 'p' until 'p' becomes less than or equal to the segment length
-            # Increment the index 'i' to move to the next control point
+        for n in range(nNewtonSteps):
+            fError = self.GaussLegendre(t[k].ravel(), u.ravel()).reshape(u.shape) - fRemaining
+            g = self.GetSplineGradients(u)
+            fSpeed = np.hypot(g[..., 0], g[..., 1])
+            u = np.clip(u - np.divide(fError, fSpeed, out=np.zeros_like(u), where=fSpeed > 0.0), t[k], t[k + 1])
+            # Newton steps on the arc length inside the step, ds/dt is the speed |dP/dt|
 
-        return float(i) + (p / self.points[i][2])
-        # Return the normalized offset value by adding the index 'i' and the ratio of 'p' to the segment length of the current control point
+        return u
+
+    def GetArcLengthTable(self, nSamplesPerSegment=16):
+        if self.vecArcLengthTable is None or self.vecArcLengthTable.shape[1] != self.GetSegmentCount() * nSamplesPerSegment + 1:
+            t = np.arange(self.GetSegmentCount() * nSamplesPerSegment + 1) / nSamplesPerSegment
+            fDistance = np.concatenate(([0.0], np.cumsum(self.GaussLegendre(t[:-1], t[1:]))))
+            self.vecArcLengthTable = np.stack((t, fDistance))
+        return self.vecArcLengthTable
+        # (2,M) table of parameters 't' evenly spaced along the spline and the distance at each one, for
+        # 'GetNormalisedOffsets'. One Gauss-Legendre rule per short step is accurate enough there
+
+    def GetSplineOffset(self, t):
+        return float(self.GetSplineOffsets(np.array([t]))[0])
+        # Map a parameter 't' to the distance along the spline
+
+    def GetSplineOffsets(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        nSegments = len(self.vecCumulativeLength) - 1
+
+        if self.bIsLooped:
+            t = np.mod(t, nSegments)
+        else:
+            t = np.clip(t, 0.0, nSegments)
+
+        i = np.clip(np.floor(t), 0, nSegments - 1)
+        return self.vecCumulativeLength[i.astype(np.int64)] + self.IntegrateSplineSpeed(i, t)
+        # Length of all the whole segments before 't' from the table, plus the part of the current segment
+
+    def SetControlPoint(self, i, x, y):
+        self.vecPoints[i] = (x, y)
+        self.setDirtyNodes.add(i)
+        self.setTessellationDirty.add(i)
+        self.vecArcLengthTable = None
+        # Move a control point and remember it so only the segments it shapes are recalculated
+
+    def GetSegmentCount(self):
+        if self.bIsLooped:
+            # If the spline is looped, every control point starts a segment
+            return len(self.vecPoints)
+        else:
+            # If the spline is not looped, the first and last two control points only shape the ends
+            return max(len(self.vecPoints) - 3, 0)
 
     def UpdateSplineProperties(self):
-        self.fTotalSplineLength = 0.0
-        # Initialize the total spline length to 0
+        nSegments = self.GetSegmentCount()
 
+        if self.setDirtyNodes and len(self.vecSegmentLength) == nSegments:
+            # Only control points moved with 'SetControlPoint' changed, so only the segments they shape are recalculated
+            node = self.GetAffectedSegments(self.setDirtyNodes)
+        else:
+            # Otherwise calculate the length of every segment
+            node = np.arange(nSegments)
+            self.vecSegmentLength = np.zeros(nSegments)
+
+        self.setDirtyNodes.clear()
+
+        self.vecSegmentLength[node] = self.IntegrateSplineSpeed(node.astype(np.float64), node + 1.0)
+        # Calculate the length of the selected segments in one batch
+
+        self.vecCumulativeLength = np.concatenate(([0.0], np.cumsum(self.vecSegmentLength)))
+        self.fTotalSplineLength = float(self.vecCumulativeLength[-1])
+        # Cumulative length table used to map between distance and 't', its last entry is the total spline length
+
+    def GetAffectedSegments(self, nodes):
+        nSegments = self.GetSegmentCount()
+        nodes = np.fromiter(nodes, dtype=np.int64)
         if self.bIsLooped:
-            # If the spline is looped
-            for i in range(len(self.points)):
-                self.points[i][2] = self.CalculateSegmentLength(i)
-                # Calculate the segment length of each control point and store it in the third element of the control point's sublist
-                self.fTotalSplineLength += self.points[i][2]
-                # Add the segment length to the total spline length
+            # A looped segment k is shaped by control points k - 1 to k + 2
+            return np.unique((nodes[:, None] + np.arange(-2, 2)) % nSegments)
         else:
-            # If the spline is not looped
-            for i in range(1, len(self.points) - 2):
-                self.points[i][2] = self.CalculateSegmentLength(i)
-                # Calculate the segment length of each internal control point and store it in the third element of the control point's sublist
-                self.fTotalSplineLength += self.points[i][2]
-                # Add the segment length to the total spline length
+            # A non-looped segment k is shaped by control points k to k + 3
+            segments = nodes[:, None] + np.arange(-3, 1)
+            return np.unique(segments[(segments >= 0) & (segments < nSegments)])
+        # Segments whose shape depends on any of the given control points
+
+    def GetTessellation(self, fTolerance=0.05):
+        nSegments = self.GetSegmentCount()
+
+        if self.fTessellationTolerance != fTolerance or len(self.vecTessellationCounts) != nSegments:
+            # Tessellate every segment
+            t, vecVertices, counts = self.TessellateSegments(np.arange(nSegments), fTolerance)
+        elif self.setTessellationDirty:
+            # Only tessellate again the segments shaped by control points moved with 'SetControlPoint'
+            segments = self.GetAffectedSegments(self.setTessellationDirty)
+            tNew, vecNew, countsNew = self.TessellateSegments(segments, fTolerance)
+
+            bKeep = ~np.isin(np.repeat(np.arange(nSegments), self.vecTessellationCounts), segments)
+            t = np.concatenate((self.vecTessellationT[:len(bKeep)][bKeep], tNew))
+            vecVertices = np.concatenate((self.vecTessellation[:len(bKeep)][bKeep], vecNew))
+            order = np.argsort(t, kind='stable')
+            t, vecVertices = t[order], vecVertices[order]
+            counts = self.vecTessellationCounts.copy()
+            counts[segments] = countsNew
+            # Splice the new vertices in among the kept ones, in order of 't'
+        else:
+            return self.vecTessellationT, self.vecTessellation
+
+        if not self.bIsLooped and nSegments:
+            # A non-looped spline also needs the vertex at its very end
+            t = np.append(t, float(nSegments))
+            vecVertices = np.vstack((vecVertices, self.GetSplinePoints(t[-1:])))
+
+        self.vecTessellationT, self.vecTessellation, self.vecTessellationCounts = t, vecVertices, counts
+        self.fTessellationTolerance = fTolerance
+        self.setTessellationDirty.clear()
+        return t, vecVertices
+        # Vertices of a polyline within fTolerance of the spline, cached until the control points change.
+        # A looped spline's polyline closes back on its first vertex
+
+    def TessellateSegments(self, segments, fTolerance, nMaxDepth=16):
+        # Adaptive tessellation of the given segments. Every interval that is not flat to within fTolerance
+        # is split in two, so straights get few vertices and hairpins many. Returns the 't' and position
+        # of every vertex in order, and how many vertices each segment got
+        segments = np.asarray(segments, dtype=np.int64)
+        a = segments.astype(np.float64)
+        b = a + 1.0
+        pa, pb = self.GetSplinePoints(a), self.GetSplinePoints(b)
+        ga, gb = self.GetSplineGradients(a), self.GetSplineGradients(b)
+
+        listT = []
+        listVertices = []
+        for nDepth in range(nMaxDepth):
+            h = (b - a)[:, None] / 3.0
+            chord = pb - pa
+            fChordSq = np.maximum(np.sum(chord * chord, axis=1), 1e-300)
+            fDeviation = np.zeros(len(a))
+            for q in (pa + h * ga, pb - h * gb):
+                u = np.clip(np.sum((q - pa) * chord, axis=1) / fChordSq, 0.0, 1.0)
+                fDeviation = np.maximum(fDeviation, np.hypot(*(q - pa - u[:, None] * chord).T))
+            # The interval is a cubic Bezier curve whose inner control points lie a third of the way
+            # along the end tangents. The curve stays inside their convex hull, so if both are within
+            # fTolerance of the chord, so is every point of the curve
+
+            done = fDeviation <= fTolerance
+            if nDepth == nMaxDepth - 1:
+                done[:] = True
+            listT.append(a[done])
+            listVertices.append(pa[done])
+            # Flat intervals keep their start as a vertex, the rest are split at their midpoint
+
+            refine = ~done
+            if not refine.any():
+                break
+            m = 0.5 * (a[refine] + b[refine])
+            pm, gm = self.GetSplinePoints(m), self.GetSplineGradients(m)
+            a, b = np.concatenate((a[refine], m)), np.concatenate((m, b[refine]))
+            pa, pb = np.concatenate((pa[refine], pm)), np.concatenate((pm, pb[refine]))
+            ga, gb = np.concatenate((ga[refine], gm)), np.concatenate((gm, gb[refine]))
+
+        t = np.concatenate(listT)
+        order = np.argsort(t, kind='stable')
+        counts = np.bincount(np.searchsorted(segments, np.floor(t[order]).astype(np.int64)), minlength=len(segments))
+        return t[order], np.concatenate(listVertices)[order], counts
+
+    def GetTableNames(self, fTolerance=None):
+        listNames = ['segment_length', 'arc_length']
+        if fTolerance is not None:
+            listNames += ['tessellation_t', 'tessellation', 'tessellation_counts']
+        return listNames
+        # Names of the arrays 'GetTables' returns
+
+    def GetTables(self, fTolerance=None):
+        # Everything calculated from the control points that is worth keeping, as named arrays for
+        # 'SetTables'. The segment lengths have to be up to date, the rest is calculated if need be
+        tables = dict(segment_length=self.vecSegmentLength, arc_length=self.GetArcLengthTable())
+        if fTolerance is not None:
+            self.GetTessellation(fTolerance)
+            tables.update(tessellation_t=self.vecTessellationT, tessellation=self.vecTessellation,
+                          tessellation_counts=self.vecTessellationCounts)
+        return tables
+
+    def SetTables(self, tables, fTolerance=None):
+        # Take the arrays 'GetTables' returned for the same control points instead of calculating them.
+        # Apart from the segment lengths they are only ever replaced, never written into, so read-only
+        # memory mapped arrays can be used as they are
+        self.vecSegmentLength = np.array(tables['segment_length'], dtype=np.float64)
+        # A copy, 'UpdateSplineProperties' writes the lengths of moved segments into it
+        self.vecCumulativeLength = np.concatenate(([0.0], np.cumsum(self.vecSegmentLength)))
+        self.fTotalSplineLength = float(self.vecCumulativeLength[-1])
+        self.setDirtyNodes.clear()
+        self.vecArcLengthTable = tables['arc_length']
+
+        if fTolerance is not None:
+            self.vecTessellationT = tables['tessellation_t']
+            self.vecTessellation = tables['tessellation']
+            self.vecTessellationCounts = tables['tessellation_counts']
+            self.fTessellationTolerance = fTolerance
+            self.setTessellationDirty.clear()
+
+    def GetSegmentIndices(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        i = np.trunc(t).astype(np.int64)
+        # Whole part of each 't', truncated towards zero just like int(t) in the scalar versions
+
+        if not self.bIsLooped:
+            # If the spline is not looped, 't' at the very end evaluates the end of the last segment
+            i = np.minimum(i, len(self.vecPoints) - 4)
+            p1 = i + 1
+            p2 = p1 + 1
+            p3 = p2 + 1
+            p0 = p1 - 1
+        else:
+            # If the spline is looped, wrap every index around the control point list
+            n = len(self.vecPoints)
+            p1 = i % n
+            p2 = (p1 + 1) % n
+            p3 = (p2 + 1) % n
+            p0 = (p1 - 1) % n
+
+        return p0, p1, p2, p3, t - i
+        # Return the four control point index arrays and the fractional part of 't'
+
+    def GetSplinePoints(self, t):
+        p0, p1, p2, p3, t = self.GetSegmentIndices(t)
+        # Batch version of 'GetSplinePoint', 't' is an array and the result is an (N,2) array
+
+        tt = t * t
+        ttt = tt * t
+
+        q1 = -ttt + 2.0 * tt - t
+        q2 = 3.0 * ttt - 5.0 * tt + 2.0
+        q3 = -3.0 * ttt + 4.0 * tt + t
+        q4 = ttt - tt
+
+        return self.BlendControlPoints(p0, p1, p2, p3, q1, q2, q3, q4)
+
+    def GetSplineGradients(self, t):
+        p0, p1, p2, p3, t = self.GetSegmentIndices(t)
+        # Batch version of 'GetSplineGradient', 't' is an array and the result is an (N,2) array
+
+        tt = t * t
+
+        q1 = -3.0 * tt + 4.0 * t - 1.0
+        q2 = 9.0 * tt - 10.0 * t
+        q3 = -9.0 * tt + 8.0 * t + 1.0
+        q4 = 3.0 * tt - 2.0 * t
+
+        return self.BlendControlPoints(p0, p1, p2, p3, q1, q2, q3, q4)
+
+    def GetSplineSecondDerivatives(self, t):
+        p0, p1, p2, p3, t = self.GetSegmentIndices(t)
+        # Rate of change of 'GetSplineGradients' with 't', as an (N,2) array
+
+        q1 = -6.0 * t + 4.0
+        q2 = 18.0 * t - 10.0
+        q3 = -18.0 * t + 8.0
+        q4 = 6.0 * t - 2.0
+
+        return self.BlendControlPoints(p0, p1, p2, p3, q1, q2, q3, q4)
+
+    def BlendControlPoints(self, p0, p1, p2, p3, q1, q2, q3, q4):
+        points = self.vecPoints
+        return 0.5 * (points[p0] * q1[..., None] + points[p1] * q2[..., None] +
+                      points[p2] * q3[..., None] + points[p3] * q4[..., None])
+        # Weight the four control points of every sample by its interpolation factors in one pass
+
+    def DrawSelf(self, gfx, ox, oy, c=0x2588, col=0x000F, nLineWidth=1, fTolerance=0.05):
+        if hasattr(gfx, 'DrawPolyline'):
+            gfx.DrawPolyline(self.GetTessellation(fTolerance)[1], col, nLineWidth, self.bIsLooped)
+            # Hand the cached tessellation, within fTolerance of the spline, to the graphics object 'gfx' as one polyline
+            return
 
-    def DrawSelf(self, gfx, ox, oy, c=0x2588, col=0x000F):
         if self.bIsLooped:
-            # If the spline is looped
-            for t in np.arange(0.0, float(len(self.points)) - 0, 0.005):
-                pos = self.GetSplinePoint(t)
-                gfx.Draw(int(pos[0]), int(pos[1]), chr(c), col)
-                # Iterate over the range of values from 0.0 to the length of the control point list
-                # Calculate the corresponding spline point for each value of 't'
-                # Convert the spline point coordinates to integers and draw the point on the graphics object 'gfx'
+            # If the spline is looped, sample from 0.0 to the length of the control point list
+            t = np.arange(0.0, float(len(self.vecPoints)) - 0, 0.005)
         else:
-            # If the spline is not looped
-            for t in np.arange(0.0, float(len(self.points)) - 3, 0.005):
-                pos = self.GetSplinePoint(t)
-                gfx.Draw(int(pos[0]), int(pos[1]), chr(c), col)
-                # Iterate over the range of values from 0.0 to the length of the control point list minus 3
-                # Calculate the corresponding spline point for each value of 't'
-                # Convert the spline point coordinates to integers and draw the point on the graphics object 'gfx'
+            # If the spline is not looped, sample from 0.0 to the length of the control point list minus 3
+            t = np.arange(0.0, float(len(self.vecPoints)) - 3, 0.005)
+
+        for pos in self.GetSplinePoints(t).astype(int):
+            gfx.Draw(pos[0], pos[1], chr(c), col)
+            # Without a polyline, evaluate all the spline points in one batch, then draw each point as a character
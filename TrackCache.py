@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# On-disk cache of solved racing lines and spline tables, so a track that has been seen before loads
+# instead of being calculated again. Entries are addressed by a hash of everything they depend on, the
+# control points and the settings, so an entry never goes stale, it only stops being asked for.
+# Every entry is a directory of .npy files, loaded memory mapped. The least recently used entries are
+# removed once the cache grows past its size limit.
+
+CACHE_FORMAT = 1
+# Part of every key, raise it when the layout of an entry changes so old entries are never read
+
+class TrackCache:
+    def __init__(self, sDirectory, nMaxBytes=256 * 1024 * 1024):
+        self.sDirectory = sDirectory
+        # Directory holding one subdirectory per entry, created on the first 'Save'
+        self.nMaxBytes = nMaxBytes
+        # Largest size of all the entries together
+        self.fTrimFraction = 0.9
+        # Fraction of nMaxBytes a cache over its limit is trimmed back to, so the saves after a trim have room
+        # before the next one
+        self.nTrackedBytes = None
+        # Size of the cache found by the last 'Evict', plus every entry saved since. None before the first
+        # 'Evict', which the first 'Save' runs
+        self.nScanInterval = 100
+        # Saves between full scans of the cache even when the tracked size is under nMaxBytes, to catch the
+        # entries other processes sharing the cache have saved
+        self.nSavesSinceScan = 0
+
+    def GetKey(self, sKind, vecPoints, **settings):
+        # Hex SHA-256 of the kind of entry, the control points and any settings the entry depends on.
+        # Settings are hashed as sorted JSON, so they have to be plain numbers, strings and booleans
+        vecPoints = np.ascontiguousarray(vecPoints, dtype=np.float64)
+        h = hashlib.sha256()
+        h.update(json.dumps([CACHE_FORMAT, sKind, vecPoints.shape, settings], sort_keys=True).encode())
+        h.update(vecPoints.tobytes())
+        return h.hexdigest()
+
+    def GetEntryDirectory(self, sKey):
+        return os.path.join(self.sDirectory, sKey)
+
+    def Load(self, sKey, listNames):
+        # Dict of the named arrays of an entry, memory mapped read-only, or None unless every one of
+        # them is cached. Loading an entry marks it as the most recently used
+        sEntry = self.GetEntryDirectory(sKey)
+        try:
+            arrays = {sName: np.load(os.path.join(sEntry, sName + '.npy'), mmap_mode='r') for sName in listNames}
+            os.utime(sEntry)
+        except (OSError, ValueError):
+            return None
+            # Missing, evicted by another process part way through, or damaged
+        return arrays
+
+    def Save(self, sKey, arrays):
+        # Store a dict of named arrays as one entry, replacing any entry saved before under the same key.
+        # The entry is written to a temporary directory and renamed into place, so other processes sharing
+        # the cache never see half an entry
+        os.makedirs(self.sDirectory, exist_ok=True)
+        sEntry = self.GetEntryDirectory(sKey)
+        sTemporary = tempfile.mkdtemp(prefix='.tmp-', dir=self.sDirectory)
+        try:
+            nBytes = 0
+            for sName, array in arrays.items():
+                sFileName = os.path.join(sTemporary, sName + '.npy')
+                np.save(sFileName, np.asarray(array))
+                nBytes += os.path.getsize(sFileName)
+        except OSError:
+            shutil.rmtree(sTemporary, ignore_errors=True)
+            raise
+
+        try:
+            os.rename(sTemporary, sEntry)
+        except OSError:
+            # A directory cannot be renamed over one that is not empty, so move the old entry aside first
+            sOld = sTemporary + '-old'
+            try:
+                os.rename(sEntry, sOld)
+                os.rename(sTemporary, sEntry)
+            except OSError:
+                # Another process saved the entry in between, its arrays are just as new
+                shutil.rmtree(sTemporary, ignore_errors=True)
+            shutil.rmtree(sOld, ignore_errors=True)
+
+        self.nSavesSinceScan += 1
+        if (self.nTrackedBytes is None or self.nTrackedBytes + nBytes > self.nMaxBytes or
+                self.nSavesSinceScan >= self.nScanInterval):
+            self.Evict()
+        else:
+            self.nTrackedBytes += nBytes
+        # Listing every entry costs as much as the cache is large, so it is only done when the cache could be
+        # over its limit. A replaced entry is counted twice until then, which only brings the scan forward
+
+    def Evict(self):
+        # Remove the least recently used entries of a cache larger than nMaxBytes, until it is no larger than
+        # fTrimFraction of nMaxBytes
+        listEntries = []
+        nTotalBytes = 0
+        with os.scandir(self.sDirectory) as it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.is_dir():
+                    continue
+                    # Skip entries still being written
+                try:
+                    nBytes = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    listEntries.append((entry.stat().st_mtime, nBytes, entry.path))
+                except OSError:
+                    continue
+                nTotalBytes += nBytes
+
+        nTargetBytes = self.nMaxBytes if nTotalBytes <= self.nMaxBytes else self.fTrimFraction * self.nMaxBytes
+        for fTime, nBytes, sPath in sorted(listEntries):
+            if nTotalBytes <= nTargetBytes:
+                break
+            shutil.rmtree(sPath, ignore_errors=True)
+            nTotalBytes -= nBytes
+
+        self.nTrackedBytes = nTotalBytes
+        self.nSavesSinceScan = 0
+
+    def GetSplineKey(self, spline, fTolerance=None):
+        return self.GetKey('spline', spline.vecPoints, looped=spline.bIsLooped, tolerance=fTolerance)
+
+    def LoadSpline(self, spline, fTolerance=None):
+        # Give a spline its segment lengths and arc-length table, and its tessellation for fTolerance
+        # if one is given, from the cache. Returns False if they are not cached, leaving the spline alone
+        tables = self.Load(self.GetSplineKey(spline, fTolerance), spline.GetTableNames(fTolerance))
+        if tables is None:
+            return False
+        spline.SetTables(tables, fTolerance)
+        return True
+
+    def SaveSpline(self, spline, fTolerance=None):
+        # Cache a spline's tables, its segment lengths have to be up to date
+        self.Save(self.GetSplineKey(spline, fTolerance), spline.GetTables(fTolerance))
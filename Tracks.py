@@ -0,0 +1,56 @@
+import csv
+import json
+import os
+import numpy as np
+
+# Track layouts shared by the game, the benchmarks and the batch tools.
+
+HANDCRAFTED_TRACK = [
+    [81.8, 195.0], [108.0, 210.0], [152.0, 216.0],
+    [182.0, 185.6], [190.0, 159.0], [198.0, 122.0], [226.0, 93.0],
+    [224.0, 41.0], [204.0, 15.0], [158.0, 24.0], [146.0, 52.0],
+    [157.0, 93.0], [124.0, 129.0], [83.0, 104.0], [77.0, 62.0],
+    [40.0, 57.0], [21.0, 83.0], [33.0, 145.0], [30.0, 198.0],
+    [48.0, 210.0]
+]
+# A handcrafted track, control points of a looped spline
+
+def GenerateTrack(nNodes, nSeed=0, fSpacing=20.0, nHarmonics=64, fRoughness=0.2):
+    # A random closed circuit of nNodes control points, roughly fSpacing apart. The radius is a sum
+    # of up to nHarmonics random harmonics, small enough that the track never crosses itself. Every
+    # node is also pushed in or out by up to fRoughness times fSpacing, so long tracks still have
+    # corners at the scale of a few nodes rather than only broad sweeps
+    rng = np.random.default_rng(nSeed)
+    a = np.linspace(0.0, 2.0 * np.pi, nNodes, endpoint=False)
+    fRadius = nNodes * fSpacing / (2.0 * np.pi)
+
+    r = np.ones(nNodes)
+    for k in range(2, 2 + min(max(3, nNodes // 8), nHarmonics)):
+        r += (rng.random() - 0.5) * 0.3 / k ** 1.2 * np.cos(k * a + rng.random() * 2.0 * np.pi)
+    r = fRadius * r + (rng.random(nNodes) * 2.0 - 1.0) * fRoughness * fSpacing
+
+    return np.column_stack((r * np.cos(a), r * np.sin(a)))
+
+def LoadTrack(sFileName):
+    # Read the control points and track width of a track file. JSON files hold an object with
+    # "points": [[x, y], ...] and optionally "track_width". CSV files have x and y columns and
+    # optionally a track_width column, of which the first value is used. Returns the (N,2) points
+    # and the track width, or None for the track width if the file does not give one
+    if os.path.splitext(sFileName)[1].lower() == '.json':
+        with open(sFileName) as f:
+            track = json.load(f)
+        return np.asarray(track['points'], dtype=np.float64).reshape(-1, 2), track.get('track_width')
+
+    with open(sFileName, newline='') as f:
+        listRows = list(csv.DictReader(f))
+    vecPoints = np.array([[float(row['x']), float(row['y'])] for row in listRows]).reshape(-1, 2)
+    listWidths = [row['track_width'] for row in listRows if row.get('track_width') not in (None, '')]
+    return vecPoints, float(listWidths[0]) if listWidths else None
+
+def SaveTrack(sFileName, vecPoints, fTrackWidth=None):
+    # Write a track file that 'LoadTrack' reads back, as JSON
+    track = dict(points=np.asarray(vecPoints, dtype=np.float64).tolist())
+    if fTrackWidth is not None:
+        track['track_width'] = fTrackWidth
+    with open(sFileName, 'w') as f:
+        json.dump(track, f)
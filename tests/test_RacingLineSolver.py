@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+import RacingLineSolver as RLS
+import RacingLineWorker as RLW
+import Spline as SP
+import Tracks
+
+def MakeCyclicBanded(n, nSeed):
+    # A random symmetric positive definite cyclic pentadiagonal matrix, as its three bands
+    rng = np.random.default_rng(nSeed)
+    d1 = rng.uniform(-1.0, 1.0, n)
+    d2 = rng.uniform(-1.0, 1.0, n)
+    d0 = 2.0 * (np.abs(d1) + np.roll(np.abs(d1), 1) + np.abs(d2) + np.roll(np.abs(d2), 2)) + rng.uniform(0.5, 1.0, n)
+    # Strictly diagonally dominant, so positive definite
+    return d0, d1, d2, rng.normal(size=n)
+
+def MakeSolver(vecPoints, fCurvatureBlend):
+    path = SP.Spline()
+    path.SetPoints(vecPoints)
+    path.UpdateSplineProperties()
+    solver = RLS.RacingLineSolver(fTrackWidth=10.0, fTolerance=1e-12)
+    solver.bMinimumCurvature = True
+    solver.fCurvatureBlend = fCurvatureBlend
+    solver.SetTrackFromSpline(path)
+    return solver
+
+def ProjectedGradient(H, c, fLower, fUpper, nMaxIterations=200000):
+    # Reference solution of min 0.5 x'Hx + c'x inside the box, by accelerated projected gradient
+    fStep = 1.0 / np.linalg.eigvalsh(H).max()
+    x = np.zeros(len(c))
+    y = x.copy()
+    fMomentum = 1.0
+    for n in range(nMaxIterations):
+        xNew = np.clip(y - fStep * (H @ y + c), fLower, fUpper)
+        if np.max(np.abs(xNew - x)) < 1e-15:
+            return xNew
+        fNext = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * fMomentum * fMomentum))
+        y = xNew + (fMomentum - 1.0) / fNext * (xNew - x)
+        x, fMomentum = xNew, fNext
+    return x
+
+@pytest.mark.parametrize('n', [3, 5, 7, 8, 9, 20, 201])
+def test_cyclic_banded_solve_matches_dense(n):
+    d0, d1, d2, b = MakeCyclicBanded(n, n)
+    A = RLS.CyclicBandedDense(d0, d1, d2)
+    assert np.allclose(A, A.T)
+    assert np.allclose(RLS.CyclicBandedMatVec(d0, d1, d2, b), A @ b, rtol=0.0, atol=1e-12)
+    assert np.allclose(RLS.SolveCyclicBanded(d0, d1, d2, b), np.linalg.solve(A, b), rtol=0.0, atol=1e-12)
+
+@pytest.mark.parametrize('vecPoints, fCurvatureBlend', [
+    (Tracks.HANDCRAFTED_TRACK, 1.0),
+    (Tracks.HANDCRAFTED_TRACK, 0.5),
+    (Tracks.HANDCRAFTED_TRACK, 0.0),
+    (Tracks.GenerateTrack(200, 4), 1.0),
+])
+def test_minimum_curvature_matches_projected_gradient(vecPoints, fCurvatureBlend):
+    solver = MakeSolver(vecPoints, fCurvatureBlend)
+    solver.Solve(1)
+    assert solver.bConverged
+    assert np.all(np.abs(solver.vecDisplacement) <= solver.fTrackWidth)
+
+    d0, d1, d2, c = solver.GetMinimumCurvatureProblem()
+    x = ProjectedGradient(RLS.CyclicBandedDense(d0, d1, d2), c, -solver.fTrackWidth, solver.fTrackWidth)
+    assert np.allclose(solver.vecDisplacement, x, rtol=0.0, atol=1e-9)
+
+def test_minimum_curvature_warm_start_is_stable():
+    solver = MakeSolver(Tracks.HANDCRAFTED_TRACK, 1.0)
+    solver.Solve(1)
+    x = solver.vecDisplacement.copy()
+
+    solver.bConverged = False
+    solver.Solve(1)
+    assert solver.nIterationsRun <= 1
+    assert np.allclose(solver.vecDisplacement, x, rtol=0.0, atol=1e-12)
+
+def test_relaxation_converges_with_adaptive_step():
+    solver = MakeSolver(Tracks.HANDCRAFTED_TRACK, 1.0)
+    solver.bMinimumCurvature = False
+    solver.fTolerance = 1e-4
+    solver.Solve(1000)
+    assert solver.bConverged
+    assert solver.nIterationsRun < 1000
+
+    solver.ResetNodes()
+    solver.bAdaptiveStep = False
+    solver.Solve(1000)
+    assert not solver.bConverged
+    # The legacy fixed step keeps bouncing around the shortest path
+
+def test_relaxation_warm_solve_after_edits_matches_fresh_solve():
+    path = SP.Spline()
+    path.SetPoints(Tracks.HANDCRAFTED_TRACK)
+    path.UpdateSplineProperties()
+    worker = RLW.RacingLineWorker()
+    worker.SetIterations(100000)
+    worker.SetTrackFromSpline(path)
+    worker.Step()
+
+    vecPoints = path.vecPoints.copy()
+    vecPoints[3] += (3.0, 2.0)
+    path.SetPoints(vecPoints)
+    path.UpdateSplineProperties()
+    worker.SetTrackFromSpline(path, range(1, 6))
+    worker.Step()
+    assert worker.solver.bConverged
+    # Moving a node the way the game does, which leaves the settled nodes with tiny steps
+
+    worker.SetOptions(fTrackWidth=15.0)
+    worker.Step()
+    assert worker.solver.bConverged
+
+    fresh = RLS.RacingLineSolver(fTrackWidth=15.0, fTolerance=1e-7)
+    fresh.SetTrackFromSpline(path)
+    fresh.Solve(100000)
+    assert fresh.bConverged
+    assert np.allclose(worker.solver.vecDisplacement, fresh.vecDisplacement, rtol=0.0, atol=1e-3)
+    # The warm solve stops at the default tolerance, the fresh one is solved much further
+
+def test_minimum_curvature_out_of_iterations_is_not_converged():
+    solver = MakeSolver(Tracks.GenerateTrack(200, 4), 1.0)
+    solver.nMaxNewtonIterations = 1
+    solver.Solve(1)
+    assert solver.fResidual >= solver.fTolerance
+    assert not solver.bConverged
+
+    solver.nMaxNewtonIterations = 100
+    solver.Solve(1)
+    assert solver.bConverged
@@ -0,0 +1,112 @@
+import time
+
+import numpy as np
+
+import SpatialIndex as SI
+import Spline as SP
+import Tracks
+
+def BruteNearest(vecPoints, vecQuery):
+    fDist = np.hypot(*(vecQuery[:, None, :] - vecPoints[None, :, :]).transpose(2, 0, 1))
+    return fDist.min(axis=1)
+
+def BruteProject(spline, vecQuery, nSamplesPerSegment=4000):
+    # Distance from every query to a dense sampling of the spline, an upper bound on the true distance,
+    # and half the largest gap between samples, which bounds how far above it the bound can be
+    t = np.arange(spline.GetSegmentCount() * nSamplesPerSegment) / nSamplesPerSegment
+    vecSamples = spline.GetSplinePoints(t)
+    fBest = np.full(len(vecQuery), np.inf)
+    for k in range(0, len(t), 10000):
+        fBest = np.minimum(fBest, BruteNearest(vecSamples[k:k + 10000], vecQuery))
+    fGap = np.hypot(*(np.roll(vecSamples, -1, axis=0) - vecSamples).T).max()
+    return fBest, 0.5 * fGap
+
+def MakePoints(nSeed):
+    rng = np.random.default_rng(nSeed)
+    vecPoints = np.vstack((rng.uniform(0.0, 100.0, (300, 2)), rng.normal(30.0, 0.5, (100, 2))))
+    # A uniform spread and a tight cluster, so cells hold very different numbers of points
+    vecQuery = rng.uniform(-50.0, 150.0, (500, 2))
+    # Queries inside the points' bounds and well outside them
+    return rng, vecPoints, vecQuery
+
+def test_point_grid_nearest_matches_brute_force():
+    rng, vecPoints, vecQuery = MakePoints(1)
+    grid = SI.PointGrid()
+    grid.Build(vecPoints)
+
+    nearest, fDistance = grid.Nearest(vecQuery)
+    fExpected = BruteNearest(vecPoints, vecQuery)
+    assert np.allclose(fDistance, fExpected, rtol=0.0, atol=1e-12)
+    assert np.allclose(np.hypot(*(vecPoints[nearest] - vecQuery).T), fExpected, rtol=0.0, atol=1e-12)
+
+    nodes = rng.choice(len(vecPoints), 50, replace=False)
+    vecPoints[nodes] = rng.uniform(0.0, 100.0, (50, 2))
+    grid.Update(nodes, vecPoints[nodes])
+    # Moved points change cells, the sorted order is repaired by the next query
+    assert np.allclose(grid.Nearest(vecQuery)[1], BruteNearest(vecPoints, vecQuery), rtol=0.0, atol=1e-12)
+
+def test_point_grid_within_radius_matches_brute_force():
+    rng, vecPoints, vecQuery = MakePoints(2)
+    grid = SI.PointGrid()
+    grid.Build(vecPoints)
+    fRadius = rng.uniform(0.0, 20.0, len(vecQuery))
+
+    owner, candidate = grid.WithinRadius(vecQuery, fRadius)
+    fDist = np.hypot(*(vecQuery[:, None, :] - vecPoints[None, :, :]).transpose(2, 0, 1))
+    expected = set(zip(*np.nonzero(fDist <= fRadius[:, None])))
+    assert len(owner) == len(expected)
+    assert set(zip(owner.tolist(), candidate.tolist())) == expected
+
+def test_spline_project_matches_brute_force():
+    rng = np.random.default_rng(3)
+    spline = SP.Spline()
+    spline.SetPoints(Tracks.HANDCRAFTED_TRACK)
+    index = SI.SplineIndex(spline)
+    index.Build()
+
+    vecQuery = spline.GetSplinePoints(rng.random(400) * len(spline.vecPoints)) + rng.normal(0.0, 10.0, (400, 2))
+    t, fDistance, vecClosest = index.Project(vecQuery)
+    fExpected, fSlack = BruteProject(spline, vecQuery)
+    assert np.allclose(vecClosest, spline.GetSplinePoints(t), rtol=0.0, atol=1e-9)
+    assert np.allclose(fDistance, np.hypot(*(vecClosest - vecQuery).T), rtol=0.0, atol=1e-9)
+    assert np.all(fDistance <= fExpected + 1e-9)
+    assert np.all(fDistance >= fExpected - fSlack)
+    # Never further than the dense samples, and no closer than their spacing allows. The refinement
+    # has to converge onto the curve for the first to hold
+
+    spline.SetControlPoint(5, 200.0, 140.0)
+    index.UpdateNodes([5])
+    t, fDistance, vecClosest = index.Project(vecQuery)
+    fExpected, fSlack = BruteProject(spline, vecQuery)
+    assert np.all(fDistance <= fExpected + 1e-9)
+    assert np.all(fDistance >= fExpected - fSlack)
+
+def test_far_queries_match_brute_force_quickly():
+    rng = np.random.default_rng(4)
+    vecPoints = rng.uniform(0.0, 100.0, (20, 2))
+    grid = SI.PointGrid()
+    grid.Build(vecPoints)
+    vecQuery = np.array([[1e4, -3e3], [-3e4, 2e4], [50.0, 1e12], [50.0, 50.0]])
+    # Far enough that walking out one ring of cells at a time would take minutes
+
+    start = time.perf_counter()
+    nearest, fDistance = grid.Nearest(vecQuery)
+    owner, candidate = grid.WithinRadius(vecQuery, fDistance + 30.0)
+    assert time.perf_counter() - start < 1.0
+    assert np.allclose(fDistance, BruteNearest(vecPoints, vecQuery), rtol=1e-12, atol=1e-12)
+    fDist = np.hypot(*(vecQuery[:, None, :] - vecPoints[None, :, :]).transpose(2, 0, 1))
+    assert set(zip(owner.tolist(), candidate.tolist())) == set(zip(*np.nonzero(fDist <= fDistance[:, None] + 30.0)))
+
+    spline = SP.Spline()
+    spline.SetPoints(Tracks.GenerateTrack(2000, 4))
+    index = SI.SplineIndex(spline)
+    index.Build()
+    vecQuery = np.vstack((spline.vecPoints.mean(axis=0), spline.vecPoints.max(axis=0) + 1e3))
+    # The middle of the infield, and a point well off the track
+
+    start = time.perf_counter()
+    t, fDistance, vecClosest = index.Project(vecQuery)
+    assert time.perf_counter() - start < 1.0
+    fExpected, fSlack = BruteProject(spline, vecQuery, 200)
+    assert np.all(fDistance <= fExpected + 1e-9)
+    assert np.all(fDistance >= fExpected - fSlack)
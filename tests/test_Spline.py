@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import Spline as SP
+import Tracks
+
+def MakeSpline(vecPoints, bIsLooped):
+    spline = SP.Spline()
+    spline.bIsLooped = bIsLooped
+    spline.SetPoints(vecPoints)
+    spline.UpdateSplineProperties()
+    return spline
+
+@pytest.mark.parametrize('vecPoints, bIsLooped', [
+    (Tracks.HANDCRAFTED_TRACK, True),
+    (Tracks.HANDCRAFTED_TRACK, False),
+    (Tracks.GenerateTrack(2000, 4), True),
+])
+def test_normalised_offsets_round_trip(vecPoints, bIsLooped):
+    spline = MakeSpline(vecPoints, bIsLooped)
+    p = np.linspace(0.0, spline.fTotalSplineLength, 3001)[:-1]
+
+    t = spline.GetNormalisedOffsets(p)
+    assert np.allclose(spline.GetSplineOffsets(t), p, rtol=0.0, atol=1e-5)
+    # Back through the adaptive integration, the distance each 't' is found at is the one asked for
+
+    tScalar = np.array([spline.GetNormalisedOffset(x) for x in p[::10].tolist()])
+    assert np.allclose(tScalar, t[::10], rtol=0.0, atol=1e-9)
+
+def test_segment_length_matches_adaptive_integration():
+    spline = MakeSpline(Tracks.GenerateTrack(200, 4), True)
+    fLength = [spline.CalculateSegmentLength(i) for i in range(spline.GetSegmentCount())]
+    assert np.allclose(fLength, spline.vecSegmentLength, rtol=0.0, atol=1e-5)
+
+def test_points_accessor_is_read_only():
+    spline = MakeSpline(Tracks.HANDCRAFTED_TRACK, True)
+    assert spline.points[3] == (*spline.vecPoints[3].tolist(), spline.vecSegmentLength[3])
+    with pytest.raises(TypeError):
+        spline.points[3][0] = 0.0
+    with pytest.raises(AttributeError):
+        spline.points.append((0.0, 0.0, 0.0))
+    # Old code writing into the list-of-lists fails loudly, rather than writing into a copy
+
+    spline.points = [[x, y, 0.0] for x, y in Tracks.HANDCRAFTED_TRACK[::-1]]
+    assert np.array_equal(spline.vecPoints, np.asarray(Tracks.HANDCRAFTED_TRACK, dtype=np.float64)[::-1])